@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Asyncio multi-board Forex controller.
+
+Behavior:
+ - one AsyncBoardController per physical board (own IP/port, state file, pacing)
+ - state handling, overflow folding, diff mode and the batch plan/commit come from
+   BoardController, the transport-independent base of ForexController
+ - MultiBoardController fans a rate batch out to every board concurrently,
+   so a slow or unreachable board no longer holds up the others
+ - boards are listed in forex_boards.json:
+       [{"name": "branch1", "ip": "192.168.1.7", "port": 20108, "min_frame_gap": 0.25}, ...]
+   (falls back to the single DEVICE_IP/DEVICE_PORT board when the file is missing)
+"""
+
+import asyncio
+import json
+import os
+import time
+
+import Forex_345_digit_backend_final as forex
+from Forex_345_digit_backend_final import (
+    BoardController, CURRENCY_NAMES, MIN_FRAME_GAP, dbg, parse_rate_entry
+)
+
+BOARDS_FILE = 'forex_boards.json'
+CONNECT_TIMEOUT = 5.0
+
+
+class AsyncBoardController(BoardController):
+    """One board driven over an asyncio stream instead of a blocking socket."""
+
+    def __init__(self, name, ip, port, state_file=None, submissions_file=None,
+                 min_frame_gap=MIN_FRAME_GAP, **kwargs):
+        self.name = name
+        self.ip = ip
+        self.port = port
+        self.min_frame_gap = min_frame_gap
+        self.reader = None
+        self.writer = None
+        self._send_lock = None
+        self._last_write = 0.0
+        super().__init__(state_file=state_file or f'forex_state_{name}.json',
+                         submissions_file=submissions_file or f'forex_submissions_{name}.jsonl',
+                         **kwargs)
+
+    # ---------- network ----------
+    async def connect_async(self, timeout=CONNECT_TIMEOUT):
+        await self.close_async()
+        try:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.ip, self.port), timeout)
+            self._last_full_refresh = None
+            print(f"🔗 [{self.name}] Connected to {self.ip}:{self.port}")
+            return True
+        except (OSError, asyncio.TimeoutError) as e:
+            print(f"❌ [{self.name}] Failed to connect to {self.ip}:{self.port}: {e or 'timed out'}")
+            self.reader = self.writer = None
+            return False
+
+    async def send_command_async(self, command, terminator="", retries=1, retry_delay=0.15):
+        """Paced send: waits out min_frame_gap since this board's last write, then writes."""
+        if self.writer is None:
+            print(f"❌ [{self.name}] Not connected to device.")
+            return False
+        if self._send_lock is None:
+            self._send_lock = asyncio.Lock()
+
+        msg = (command + terminator).encode()
+        async with self._send_lock:
+            gap = self.min_frame_gap - (time.monotonic() - self._last_write)
+            if gap > 0:
+                await asyncio.sleep(gap)
+
+            attempt = 0
+            while attempt < retries:
+                try:
+                    if self.writer is None:
+                        raise ConnectionError("writer is None")
+                    dbg(f"[{self.name}] MSG --> {msg}")
+                    self.writer.write(msg)
+                    await self.writer.drain()
+                    self._last_write = time.monotonic()
+                    self._count_frame(True, len(msg))
+                    return True
+                except (OSError, ConnectionError) as e:
+                    self._last_write = time.monotonic()
+                    attempt += 1
+                    print(f"❌ [{self.name}] Socket error while sending '{command}': {e} "
+                          f"(attempt {attempt}/{retries})")
+                    if attempt < retries:
+                        await asyncio.sleep(retry_delay)
+            self._count_frame(False, len(msg))
+            return False
+
+    # ---------- atomic update + rollback ----------
+    async def set_currency_rates_async(self, rates, send_retries=1):
+        """Async counterpart of ForexController.set_currency_rates (same plan/commit/rollback)."""
+        plan = self._plan_rate_batch(rates)
+        if not plan['mains']:
+            return plan['results']
+
+        outcomes = []
+        for cmd, _ in plan['frames']:
+            ok = await self.send_command_async(cmd, retries=send_retries)
+            outcomes.append(ok)
+            if not ok:
+                break  # the batch is lost anyway, don't queue more frames
+
+        if all(outcomes):
+            refreshed = False
+            if plan['refresh'] is not None:
+                refreshed = all([await self.send_command_async(cmd, retries=send_retries)
+                                 for cmd in plan['refresh']])
+            return self._commit_rate_batch(plan, refreshed)
+
+        if self._report_rate_batch_failure(plan, outcomes):
+            for _, rollback_cmd in plan['frames'][:len(outcomes)]:
+                dbg(f"[{self.name}] Rollback: {rollback_cmd}")
+                await self.send_command_async(rollback_cmd, retries=send_retries)
+            print(f"❌ [{self.name}] Failed to set {plan['names']} atomically (partial failure).")
+        plan['results'].update({c: False for c in plan['mains']})
+        return plan['results']
+
+    async def close_async(self):
+        if self.writer is not None:
+            writer, self.writer, self.reader = self.writer, None, None
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+            print(f"🔌 [{self.name}] Connection closed.")
+
+    async def shutdown_async(self):
+        await self.close_async()
+        self.close_storage()
+
+
+class MultiBoardController:
+    """Fan-out controller: every call runs on all boards in parallel."""
+
+    def __init__(self, boards):
+        self.boards = list(boards)
+
+    @classmethod
+    def from_config(cls, path=BOARDS_FILE, **kwargs):
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                entries = json.load(f)
+        else:
+            print(f"⚠️  {path} not found, using single board {forex.DEVICE_IP}:{forex.DEVICE_PORT}")
+            entries = [{'name': 'main', 'ip': forex.DEVICE_IP, 'port': forex.DEVICE_PORT}]
+
+        boards = []
+        for entry in entries:
+            opts = dict(kwargs)
+            opts.update({k: v for k, v in entry.items() if k not in ('name', 'ip', 'port')})
+            boards.append(AsyncBoardController(entry['name'], entry['ip'], int(entry['port']), **opts))
+        return cls(boards)
+
+    async def _gather(self, make_call, boards=None):
+        boards = self.boards if boards is None else boards
+        outcomes = await asyncio.gather(*(make_call(b) for b in boards), return_exceptions=True)
+        out = {}
+        for board, outcome in zip(boards, outcomes):
+            if isinstance(outcome, Exception):
+                print(f"❌ [{board.name}] {outcome!r}")
+                outcome = None
+            out[board.name] = outcome
+        return out
+
+    async def connect_all(self, timeout=CONNECT_TIMEOUT):
+        return await self._gather(lambda b: b.connect_async(timeout))
+
+    async def set_currency_rates(self, rates, send_retries=1):
+        """Returns {board_name: {currency_code: bool}}."""
+        out = await self._gather(lambda b: b.set_currency_rates_async(rates, send_retries))
+        return {name: r if r is not None else {c: False for c in rates} for name, r in out.items()}
+
+    async def set_currency_rate(self, currency_code, rate_value, send_retries=1):
+        """Returns {board_name: bool}."""
+        out = await self.set_currency_rates({currency_code: rate_value}, send_retries)
+        return {name: r[currency_code] for name, r in out.items()}
+
+    async def reconnect_missing(self, timeout=CONNECT_TIMEOUT):
+        return await self._gather(lambda b: b.connect_async(timeout),
+                                  [b for b in self.boards if b.writer is None])
+
+    async def shutdown(self):
+        await self._gather(lambda b: b.shutdown_async())
+
+    def display_current_state(self):
+        for board in self.boards:
+            print(f"\n🏢 === Board {board.name} ({board.ip}:{board.port}) ===")
+            board.display_current_state()
+
+
+# ---------- CLI main ----------
+async def main_async(config_path=BOARDS_FILE):
+    controller = MultiBoardController.from_config(config_path)
+    connected = await controller.connect_all()
+    print(f"🔗 Connected boards: {sum(1 for ok in connected.values() if ok)}/{len(connected)}")
+
+    loop = asyncio.get_running_loop()
+    try:
+        print("\n🚀 === Multi-board Forex Rate Controller ===")
+        print("📋 Commands:")
+        print("   - Set rate(s): A123, B4567, C98765, F12345 (comma-separated)")
+        print("   - 'status' - Show current state of every board")
+        print("   - 'reconnect' - Retry boards that are not connected")
+        print("   - 'exit' - Quit program")
+
+        while True:
+            user_input = (await loop.run_in_executor(
+                None, input, "\n💬 Enter command (comma-separated for multiple rates): ")).strip().upper()
+
+            if user_input == 'EXIT':
+                print("👋 Exiting...")
+                break
+
+            if user_input == 'STATUS':
+                controller.display_current_state()
+                continue
+
+            if user_input == 'RECONNECT':
+                await controller.reconnect_missing()
+                continue
+
+            entries = [entry.strip() for entry in user_input.split(',') if entry.strip()]
+            batch = {}
+            rejected = []
+            for entry in entries:
+                currency_code, rate_digits, error = parse_rate_entry(entry)
+                if error:
+                    rejected.append({'entry': entry, 'success': False, 'error': error})
+                else:
+                    batch[currency_code] = rate_digits
+            if not batch:
+                print("❌ No valid entries found.")
+                if rejected:
+                    for board in controller.boards:
+                        board.log_submission(user_input, entries, rejected)
+                continue
+
+            outcome = await controller.set_currency_rates(batch)
+            for board in controller.boards:
+                results = rejected + [{'entry': f"{c}{v}", 'currency': CURRENCY_NAMES[c],
+                                       'success': outcome[board.name].get(c, False),
+                                       'error': None if outcome[board.name].get(c) else 'Failed to set rate'}
+                                      for c, v in batch.items()]
+                board.log_submission(user_input, entries, results)
+                ok = all(r['success'] for r in results)
+                print(f"{'✅' if ok else '⚠️ '} [{board.name}] "
+                      f"{sum(r['success'] for r in results)}/{len(results)} rates updated")
+
+    except (KeyboardInterrupt, EOFError):
+        print("\n\n⚡ Interrupted by user")
+    finally:
+        await controller.shutdown()
+
+
+def main():
+    asyncio.run(main_async())
+
+
+if __name__ == "__main__":
+    main()
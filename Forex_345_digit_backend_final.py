@@ -12,18 +12,52 @@ Behavior:
          - resend previous main
          - resend previous overflow module value
     * rollback is best-effort (device is not guaranteed to apply commands)
+ - frames go through a paced transmit queue (MIN_FRAME_GAP between writes)
 """
 
 import socket
 import json
 import os
+import random
+import select
 import time
+import threading
+from collections import deque
 from datetime import datetime
 
 # Device configuration
 DEVICE_IP = '192.168.1.7'
 DEVICE_PORT = 20108
 
+# Minimum gap (seconds) between two consecutive frames on the wire.
+# Measured from the previous write, so the caller never pays it after the last frame.
+MIN_FRAME_GAP = 0.25
+
+# Diff-aware sending: skip frames whose module already shows the committed value.
+# FORCE_REFRESH_INTERVAL (seconds) re-sends everything now and then in case the
+# board lost power; None disables the periodic refresh.
+DIFF_MODE = False
+FORCE_REFRESH_INTERVAL = 300
+
+# Write-behind state persistence: coalesce state changes and write at most once
+# per STATE_FLUSH_INTERVAL seconds (None -> write synchronously on every change).
+STATE_FLUSH_INTERVAL = 2.0
+
+# Submission journal: append-only JSON lines, rotated by size.
+SUBMISSIONS_KEEP = 5                 # entries kept in memory for the "last N" view
+SUBMISSIONS_MAX_BYTES = 1024 * 1024  # rotate the journal once it grows past this
+SUBMISSIONS_BACKUPS = 5              # rotated files kept (file.1 .. file.N)
+
+# Connection supervision (see ConnectionSupervisor)
+PROBE_INTERVAL = 5.0          # seconds between liveness probes of the open socket
+RECONNECT_BACKOFF_BASE = 1.0  # first reconnect delay; doubles per failure (with full jitter)
+RECONNECT_BACKOFF_MAX = 30.0
+DISCONNECTED_POLICY = 'queue' # 'queue': hold latest rates until reconnect, 'reject': fail fast
+
+# Outcome of a rate held in pending_rates while disconnected (set_currency_rates
+# returns it instead of True/False); the supervisor applies it after reconnecting.
+QUEUED = 'queued'
+
 # Debugging: set True to see dbg prints
 DEBUG = True
 
@@ -56,12 +90,461 @@ def dbg(*args, **kwargs):
         print(*args, **kwargs)
 
 
-class ForexController:
-    def __init__(self, state_file='forex_state.json', submissions_file='forex_submissions.json'):
-        self.client_socket = None
+class PendingFrame:
+    """A frame queued on the PacedTransmitter. wait() returns True once it was written."""
+
+    def __init__(self, command, msg, retries, retry_delay):
+        self.command = command
+        self.msg = msg
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.success = False
+        self._done = threading.Event()
+
+    def finish(self, success):
+        self.success = success
+        self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        if not self._done.wait(timeout):
+            return False
+        return self.success
+
+
+class PacedTransmitter:
+    """
+    Background writer that drains queued frames to the device socket.
+
+    Instead of sleeping after every sendall(), the writer keeps at least
+    `min_gap` seconds between consecutive writes (measured from the last write).
+    Callers can queue frames and continue while earlier frames drain.
+    """
+
+    def __init__(self, get_socket, min_gap=MIN_FRAME_GAP, on_error=None, on_frame=None):
+        self.get_socket = get_socket
+        self.min_gap = min_gap
+        self.on_error = on_error
+        self.on_frame = on_frame    # on_frame(frame, success) once per frame, before wait() returns
+        self.last_write = 0.0
+        self.frames_sent = 0
+        self.frames_failed = 0
+        self.bytes_sent = 0
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._busy = False
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="forex-tx", daemon=True)
+            self._thread.start()
+
+    def submit(self, frame):
+        with self._cond:
+            self._ensure_thread()
+            self._queue.append(frame)
+            self._cond.notify_all()
+        return frame
+
+    def pending(self):
+        with self._cond:
+            return len(self._queue)
+
+    def flush(self, timeout=None):
+        """Block until every queued frame was written (or failed). Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+        # anything left in the queue can no longer be written
+        with self._cond:
+            while self._queue:
+                self._queue.popleft().finish(False)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                frame = self._queue.popleft()
+                self._busy = True
+
+            # pace against the previous write, not a blind sleep after each frame
+            gap = self.min_gap - (time.monotonic() - self.last_write)
+            if gap > 0:
+                time.sleep(gap)
+
+            success = self._write(frame)
+            if self.on_frame:
+                self.on_frame(frame, success)
+            frame.finish(success)
+
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def _write(self, frame):
+        attempt = 0
+        while attempt < frame.retries:
+            sock = self.get_socket()
+            try:
+                if sock is None:
+                    raise socket.error("socket is None")
+                dbg(f"MSG --> {frame.msg}")
+                sock.sendall(frame.msg)
+                self.last_write = time.monotonic()
+                self.frames_sent += 1
+                self.bytes_sent += len(frame.msg)
+                dbg(f"📤 Sent: {frame.msg.decode()}")
+                return True
+            except (socket.error, AttributeError) as e:
+                self.last_write = time.monotonic()
+                attempt += 1
+                print(f"❌ Socket error while sending '{frame.command}': {e} (attempt {attempt}/{frame.retries})")
+                if attempt < frame.retries:
+                    time.sleep(frame.retry_delay)
+        self.frames_failed += 1
+        if self.on_error:
+            self.on_error(sock)
+        return False
+
+
+def atomic_write_json(path, payload, indent=2):
+    """Write JSON to a temp file in the same directory, fsync it and rename over `path`."""
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(payload, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class StatePersister:
+    """
+    Write-behind persister for a JSON document.
+
+    mark_dirty() only flags the document as changed; a background thread writes
+    it (atomically) at most once per `interval` seconds, and flush()/stop()
+    write any pending change immediately. With interval=None every mark_dirty()
+    writes synchronously.
+    """
+
+    def __init__(self, path, get_payload, interval=STATE_FLUSH_INTERVAL):
+        self.path = path
+        self.get_payload = get_payload
+        self.interval = interval
+        self.writes = 0
+        self._dirty = False
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+
+    def mark_dirty(self):
+        if not self.interval:
+            self._dirty = True
+            self.flush()
+            return
+        with self._cond:
+            self._dirty = True
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped = False
+                self._thread = threading.Thread(target=self._run, name="forex-persist", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def flush(self):
+        """Write the document now if it changed since the last write. Returns True on success."""
+        with self._write_lock:
+            with self._cond:
+                if not self._dirty:
+                    return True
+                self._dirty = False
+            try:
+                atomic_write_json(self.path, self.get_payload())
+                self.writes += 1
+                dbg(f"💾 State saved to {self.path}")
+                return True
+            except Exception as e:
+                print(f"⚠️  Could not save state: {e}")
+                with self._cond:
+                    self._dirty = True
+                return False
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._dirty and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                # let more changes pile up before writing (mark_dirty notifies,
+                # so keep waiting until the interval has really passed)
+                deadline = time.monotonic() + self.interval
+                remaining = self.interval
+                while remaining > 0 and not self._stopped:
+                    self._cond.wait(remaining)
+                    remaining = deadline - time.monotonic()
+                if self._stopped:
+                    return
+            self.flush()
+
+
+class SubmissionJournal:
+    """
+    Append-only JSON-lines journal with size-based rotation.
+
+    Each record is one line; when the file grows past `max_bytes` it is renamed
+    to `<path>.1` (older ones shift to .2, .3 ...) and a fresh file is started.
+    tail(n) reads only the end of the journal, not the whole file.
+    """
+
+    def __init__(self, path, max_bytes=SUBMISSIONS_MAX_BYTES, backups=SUBMISSIONS_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._fh = None
+        self._lock = threading.Lock()
+
+    def append(self, record):
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self._lock:
+            if self._fh is None:
+                self._fh = open(self.path, 'a', encoding='utf-8')
+            self._fh.write(line)
+            self._fh.flush()
+            if self.max_bytes and self._fh.tell() >= self.max_bytes:
+                self._rotate()
+
+    def _rotate(self):
+        self._fh.close()
+        self._fh = None
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    @staticmethod
+    def _tail_lines(path, n, block_size=4096):
+        """Return up to the last n non-empty lines of `path`, reading backwards in blocks."""
+        if n <= 0 or not os.path.exists(path):
+            return []
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            data = b''
+            while pos > 0 and data.count(b'\n') <= n:
+                step = min(block_size, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
+        lines = data.split(b'\n')
+        if pos > 0:
+            lines = lines[1:]  # first line may be cut in half (empty if the block starts on a newline)
+        return [l for l in lines if l.strip()][-n:]
+
+    def tail(self, n):
+        """Last n records (oldest first), spilling into rotated files if needed."""
+        lines = self._tail_lines(self.path, n)
+        i = 1
+        while len(lines) < n and i <= self.backups:
+            lines = self._tail_lines(f"{self.path}.{i}", n - len(lines)) + lines
+            i += 1
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                dbg(f"Skipping corrupt journal line: {line[:80]!r}")
+        return records
+
+    def import_legacy(self, legacy_path):
+        """
+        Append the records of a pre-journal JSON list file (forex_submissions.json)
+        once: only when the journal does not exist yet. The old file is renamed to
+        `<legacy_path>.imported` afterwards so it is never imported twice.
+        Returns the number of records imported.
+        """
+        if not os.path.exists(legacy_path) or os.path.exists(self.path):
+            return 0
+        with open(legacy_path, 'r') as f:
+            saved = json.load(f)
+        records = [r for r in saved if isinstance(r, dict)] if isinstance(saved, list) else []
+        for record in records:
+            self.append(record)
+        self.close()
+        os.replace(legacy_path, f"{legacy_path}.imported")
+        return len(records)
+
+    def close(self):
+        with self._lock:
+            if self._fh:
+                os.fsync(self._fh.fileno())
+                self._fh.close()
+                self._fh = None
+
+
+def enable_keepalive(sock, idle=10, interval=5, count=3):
+    """Turn on TCP keepalive so half-open connections are detected by the OS."""
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    for name, value in (('TCP_KEEPIDLE', idle), ('TCP_KEEPINTVL', interval), ('TCP_KEEPCNT', count)):
+        if hasattr(socket, name):
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, name), value)
+            except OSError:
+                pass
+
+
+def socket_alive(sock):
+    """Non-blocking probe: False if the peer closed or reset the connection."""
+    try:
+        readable, _, errored = select.select([sock], [], [sock], 0)
+        if errored:
+            return False
+        if readable:
+            # the board never talks back; readable with no data means EOF
+            return sock.recv(1, socket.MSG_PEEK) != b''
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+class ConnectionSupervisor:
+    """
+    Background thread that keeps the controller connected.
+
+    - probes the open socket every `probe_interval` seconds (plus TCP keepalive)
+    - reconnects off the hot path with exponential backoff and full jitter
+    - after reconnecting, replays the committed state and any rates queued
+      while disconnected (policy 'queue'); with policy 'reject' updates fail fast
+    """
+
+    def __init__(self, controller, probe_interval=PROBE_INTERVAL, policy=DISCONNECTED_POLICY,
+                 backoff_base=RECONNECT_BACKOFF_BASE, backoff_max=RECONNECT_BACKOFF_MAX,
+                 connect_timeout=5.0):
+        if policy not in ('queue', 'reject'):
+            raise ValueError(f"Unknown disconnected policy: {policy}")
+        self.controller = controller
+        self.probe_interval = probe_interval
+        self.policy = policy
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.connect_timeout = connect_timeout
+        self.reconnects = 0
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="forex-supervisor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=self.connect_timeout + 1.0)
+
+    def notify_failure(self):
+        """Called when a send fails: check the connection right away."""
+        self._wake.set()
+
+    def _sleep(self, seconds):
+        self._wake.wait(seconds)
+        self._wake.clear()
+
+    def _run(self):
+        failures = 0
+        while not self._stopped.is_set():
+            sock = self.controller.client_socket
+            if sock is not None and socket_alive(sock):
+                failures = 0
+                self._sleep(self.probe_interval)
+                continue
+
+            if sock is not None:
+                print("⚠️  Connection to device lost, reconnecting in background...")
+                self.controller.drop_connection(sock)
+
+            # the replay runs under the controller lock the new socket is published in,
+            # so no caller batch can reach the board before it
+            if self.controller.connect_to_device(timeout=self.connect_timeout,
+                                                 on_connect=self.controller.replay_after_reconnect):
+                failures = 0
+                self.reconnects += 1
+                continue
+
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** failures)))
+            failures += 1
+            dbg(f"Reconnect attempt {failures} failed, next try in {delay:.2f}s")
+            self._sleep(delay)
+
+
+class BoardController:
+    """
+    Transport-independent part of a board controller: the committed state and
+    its write-behind persistence, the submission journal, and the plan/commit
+    logic of an atomic rate batch (overflow folding, diff mode). Subclasses
+    put the planned frames on the wire (ForexController over a blocking socket,
+    AsyncBoardController over an asyncio stream) and provide frame_stats().
+    """
+
+    def __init__(self, state_file='forex_state.json', submissions_file='forex_submissions.jsonl',
+                 diff_mode=DIFF_MODE, force_refresh_interval=FORCE_REFRESH_INTERVAL,
+                 state_flush_interval=STATE_FLUSH_INTERVAL):
+        # Serializes state and every plan/send/commit on the board between threads
+        # (re-entrant: ForexController's replay applies queued rates through set_currency_rates).
+        self._state_lock = threading.RLock()
+        self.diff_mode = diff_mode
+        self.force_refresh_interval = force_refresh_interval
+        self.frames_sent = 0
+        self.frames_failed = 0
+        self.frames_suppressed = 0
+        self.bytes_sent = 0
+        self._last_full_refresh = None  # None -> board contents unknown, send everything
         self.state_file = state_file
         self.submissions_file = submissions_file
-        self.submissions_history = []
+        self.submissions_history = deque(maxlen=SUBMISSIONS_KEEP)
+        self.submissions_journal = SubmissionJournal(submissions_file)
+        self.state_persister = StatePersister(state_file, self._state_snapshot,
+                                              interval=state_flush_interval)
 
         # default state
         self.state = {
@@ -119,23 +602,32 @@ class ForexController:
             print(f"⚠️  Could not load state file: {e}")
             print("🆕 Starting with fresh state")
 
+    def _state_snapshot(self):
+        """Deep copy of the state for the persister thread."""
+        with self._state_lock:
+            return json.loads(json.dumps(self.state))
+
     def save_state(self):
-        try:
-            self.state['last_updated'] = datetime.now().isoformat()
-            with open(self.state_file, 'w') as f:
-                json.dump(self.state, f, indent=2)
-            print(f"💾 State saved to {self.state_file}")
-        except Exception as e:
-            print(f"⚠️  Could not save state: {e}")
+        """Stamp the state and schedule a write-behind flush (see StatePersister)."""
+        self.state['last_updated'] = datetime.now().isoformat()
+        self.state_persister.mark_dirty()
+
+    def flush_state(self):
+        """Write any pending state change to disk now."""
+        return self.state_persister.flush()
 
     # ---------- submission history ----------
     def load_submissions(self):
+        """Fill the in-memory "last N" view from the tail of the journal."""
         try:
+            # history of the JSON list file used before the journal, e.g. forex_submissions.json
+            base, ext = os.path.splitext(self.submissions_file)
+            if ext == '.jsonl':
+                imported = self.submissions_journal.import_legacy(base + '.json')
+                if imported:
+                    print(f"📋 Imported {imported} submissions from {base}.json")
             if os.path.exists(self.submissions_file):
-                with open(self.submissions_file, 'r') as f:
-                    saved = json.load(f)
-                if isinstance(saved, list):
-                    self.submissions_history = saved[-5:]
+                self.submissions_history.extend(self.submissions_journal.tail(SUBMISSIONS_KEEP))
                 print(f"📋 Loaded {len(self.submissions_history)} previous submissions")
             else:
                 print("📋 Starting with empty submission history")
@@ -143,9 +635,9 @@ class ForexController:
             print(f"⚠️  Could not load submissions file: {e}")
 
     def save_submissions(self):
+        """Force journal contents to disk (records are already appended as they arrive)."""
         try:
-            with open(self.submissions_file, 'w') as f:
-                json.dump(self.submissions_history, f, indent=2)
+            self.submissions_journal.close()
         except Exception as e:
             print(f"⚠️  Could not save submissions: {e}")
 
@@ -156,166 +648,159 @@ class ForexController:
             'entries': entries,
             'results': results,
             'success_count': sum(1 for r in results if r['success']),
+            'queued_count': sum(1 for r in results if r.get('queued')),
             'total_count': len(results),
         }
         self.submissions_history.append(submission)
-        self.submissions_history = self.submissions_history[-5:]
-        self.save_submissions()
-
-    # ---------- network ----------
-    def connect_to_device(self, timeout=5.0):
         try:
-            if self.client_socket:
-                try:
-                    self.client_socket.close()
-                except Exception:
-                    pass
-                self.client_socket = None
-
-            self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.client_socket.settimeout(timeout)
-            self.client_socket.connect((DEVICE_IP, DEVICE_PORT))
-            print(f"🔗 Connected to {DEVICE_IP}:{DEVICE_PORT}")
-            return True
-        except socket.error as e:
-            print(f"❌ Failed to connect to the device: {e}")
-            self.client_socket = None
-            return False
-
-    def connect_with_retry(self, max_retries=3, backoff_factor=2):
-        print(f"🔄 Attempting connection with up to {max_retries} retries...")
-        for attempt in range(max_retries):
-            dbg(f"Attempt {attempt+1}/{max_retries}")
-            if self.connect_to_device():
-                return True
-            if attempt < max_retries - 1:
-                wait_time = backoff_factor ** attempt
-                print(f"⏳ Connection failed. Retrying in {wait_time}s...")
-                time.sleep(wait_time)
-            else:
-                print(f"❌ All {max_retries} connection attempts failed")
-        return False
+            self.submissions_journal.append(submission)
+        except Exception as e:
+            print(f"⚠️  Could not save submissions: {e}")
 
-    def send_command(self, command, terminator="", retries=1, retry_delay=0.15):
-        """
-        Send a command to the device.
+    def _count_frame(self, success, nbytes):
+        """Called by the transport once per frame written (or given up on)."""
+        if success:
+            self.frames_sent += 1
+            self.bytes_sent += nbytes
+        else:
+            self.frames_failed += 1
+
+    def frame_stats(self):
+        """Counters for frames written, failed and skipped by diff mode."""
+        return {
+            'frames_sent': self.frames_sent,
+            'frames_failed': self.frames_failed,
+            'frames_suppressed': self.frames_suppressed,
+            'bytes_sent': self.bytes_sent,
+        }
 
-        Because the device does not send acknowledgements in your environment,
-        we consider a successful socket.sendall() (no exception) as success.
-        retries: number of attempts (default 1). If >1, will try again on exception.
-        """
-        if not self.client_socket:
-            print("❌ Not connected to device (socket is None).")
+    def _needs_full_refresh(self):
+        """In diff mode, True when the board should get every frame regardless of state."""
+        if self._last_full_refresh is None:
+            return True
+        if self.force_refresh_interval is None:
             return False
-
-        msg = (command + terminator).encode()
-        attempt = 0
-        while attempt < retries:
-            try:
-                dbg(f"MSG --> {msg}")
-                self.client_socket.sendall(msg)
-                dbg(f"📤 Sent: {command}{terminator}")
-                # small delay to allow device to process commands sequentially
-                time.sleep(0.25)
-                return True
-            except (socket.error, AttributeError) as e:
-                attempt += 1
-                print(f"❌ Socket error while sending '{command}': {e} (attempt {attempt}/{retries})")
-                if attempt < retries:
-                    time.sleep(retry_delay)
-                else:
-                    return False
+        return time.monotonic() - self._last_full_refresh >= self.force_refresh_interval
 
     # ---------- overflow helper ----------
-    def _prepare_overflow_module_for_currency(self, currency_code, new_digit):
+    def _prepare_overflow_module_for_currency(self, currency_code, new_digit, working=None):
         """
         Compute previous and new overflow module strings for the given currency.
         Returns (module_name, position, prev_list, new_list, prev_value_str, new_value_str)
         If no overflow mapping exists, returns (None, None, None, None, None, None)
+        working: optional {'e_module': [...], ...} to build on instead of self.state
+                 (used by set_currency_rates to stack several digits into one frame).
         """
         if currency_code not in OVERFLOW_POSITIONS:
             return (None, None, None, None, None, None)
         module_name, position = OVERFLOW_POSITIONS[currency_code]
         key = f"{module_name.lower()}_module"
-        prev_list = self.state.get(key, ['0', '0', '0', '0'])[:]
+        source = working if working is not None and key in working else self.state
+        prev_list = source.get(key, ['0', '0', '0', '0'])[:]
         new_list = prev_list[:]
         new_list[position] = str(new_digit)
         prev_val = ''.join(prev_list)
         new_val = ''.join(new_list)
         return (module_name, position, prev_list, new_list, prev_val, new_val)
 
-    # ---------- atomic update + rollback ----------
-    def set_currency_rate(self, currency_code, rate_value, send_retries=1):
+    # ---------- atomic update: plan + commit ----------
+    def _plan_rate_batch(self, rates):
         """
-        Atomic update: send main module then overflow module.
-        If overflow fails after main succeeded -> attempt rollback by resending
-        previous main and previous overflow values (best-effort).
-        Returns True if final state consistent and saved, False otherwise.
-        send_retries: passed to send_command (useful for flaky networks).
+        Validate a batch and work out the frames it needs (no I/O).
+        Returns a dict with:
+          results  - {currency_code: False} for invalid entries
+          mains    - {currency_code: (main_digits, padded_value)}
+          overflow - {module_name: (prev_list, new_list)}
+          frames   - [(command, rollback_command)] still to send after diff suppression
+          suppressed - frames diff mode skipped (counted once the batch commits)
+          refresh  - commands re-sending untouched modules when a diff-mode refresh is due, else None
         """
-        currency_name = CURRENCY_NAMES.get(currency_code, currency_code)
-        if len(rate_value) not in (3, 4, 5):
-            print(f"❌ Invalid rate length for {currency_code}: {len(rate_value)}")
-            return False
-
-        padded_value = rate_value.zfill(5)  # ensure 5 chars: main(4) + overflow(1)
-        main_digits, fifth_digit = padded_value[:4], padded_value[4]
-        dbg(f"Setting {currency_code}: main={main_digits}, overflow={fifth_digit}")
-
-        # Save previous state for rollback
-        prev_main = self.state['main_modules'].get(currency_code, '0000')
-        (module_name, position,
-         prev_module_list, new_module_list,
-         prev_module_value, new_module_value) = \
-            self._prepare_overflow_module_for_currency(currency_code, fifth_digit)
-
-        # 1) Send main digits
-        main_cmd = f"{currency_code}{main_digits}"
-        main_success = self.send_command(main_cmd, retries=send_retries)
-        if not main_success:
-            print(f"❌ Failed to send main digits for {currency_name} ({main_cmd})")
-            return False
-
-        # 2) Send overflow module (if applicable)
-        overflow_success = True
-        if module_name:
-            overflow_cmd = f"{module_name}{new_module_value}"
+        results = {}
+        mains = {}       # currency_code -> (main_digits, padded_value)
+        for currency_code, rate_value in rates.items():
+            if len(rate_value) not in (3, 4, 5):
+                print(f"❌ Invalid rate length for {currency_code}: {len(rate_value)}")
+                results[currency_code] = False
+                continue
+            padded_value = rate_value.zfill(5)  # ensure 5 chars: main(4) + overflow(1)
+            mains[currency_code] = (padded_value[:4], padded_value)
+            dbg(f"Setting {currency_code}: main={padded_value[:4]}, overflow={padded_value[4]}")
+
+        # Fold every 5th digit into its overflow module once
+        overflow = {}    # module_name -> (prev_list, new_list)
+        working = {}
+        for currency_code, (_, padded_value) in mains.items():
+            (module_name, _, prev_module_list, new_module_list, _, _) = \
+                self._prepare_overflow_module_for_currency(currency_code, padded_value[4], working)
+            if module_name:
+                key = f"{module_name.lower()}_module"
+                working[key] = new_module_list
+                original = overflow.get(module_name, (prev_module_list, None))[0]
+                overflow[module_name] = (original, new_module_list)
+
+        # In diff mode only modules whose value changes go on the wire
+        full_refresh = not self.diff_mode or self._needs_full_refresh()
+
+        frames = []      # (command, rollback_command)
+        suppressed = 0
+        for currency_code, (main_digits, _) in mains.items():
+            prev_main = self.state['main_modules'].get(currency_code, '0000')
+            if not full_refresh and main_digits == prev_main:
+                dbg(f"Unchanged, skipping {currency_code}{main_digits}")
+                suppressed += 1
+                continue
+            frames.append((f"{currency_code}{main_digits}", f"{currency_code}{prev_main}"))
+        for module_name, (prev_module_list, new_module_list) in overflow.items():
+            overflow_cmd = f"{module_name}{''.join(new_module_list)}"
+            if not full_refresh and new_module_list == prev_module_list:
+                dbg(f"Unchanged, skipping {overflow_cmd}")
+                suppressed += 1
+                continue
             dbg(f"Sending overflow command: {overflow_cmd}")
-            overflow_success = self.send_command(overflow_cmd, retries=send_retries)
-            # overflow_success = False     ##########################################################################
+            frames.append((overflow_cmd, f"{module_name}{''.join(prev_module_list)}"))
+
+        # Refresh due: also re-send the committed value of modules outside this batch
+        refresh = None
+        if mains and self.diff_mode and full_refresh:
+            refresh = [f"{code}{self.state['main_modules'].get(code, '0000')}"
+                       for code in ALL_CURRENCIES if code not in mains]
+            for m in OVERFLOW_MODULE_NAMES:
+                if m not in overflow:
+                    refresh.append(f"{m}{''.join(self.state.get(f'{m.lower()}_module', ['0', '0', '0', '0']))}")
+
+        return {
+            'results': results,
+            'mains': mains,
+            'overflow': overflow,
+            'frames': frames,
+            'suppressed': suppressed,
+            'refresh': refresh,
+            'names': ', '.join(CURRENCY_NAMES.get(c, c) for c in mains),
+        }
 
-        # 3) Commit or rollback
-        if main_success and overflow_success:
-            # commit to in-memory state and persist to disk
+    def _commit_rate_batch(self, plan, refreshed=False):
+        """Apply a fully sent batch to the in-memory state and schedule a save."""
+        for currency_code, (main_digits, padded_value) in plan['mains'].items():
             self.state['main_modules'][currency_code] = main_digits
-            if module_name:
-                key = f"{module_name.lower()}_module"
-                self.state[key] = new_module_list
-            print(f"✅ Successfully set {currency_name} -> {padded_value}")
+            print(f"✅ Successfully set {CURRENCY_NAMES.get(currency_code, currency_code)} -> {padded_value}")
+        for module_name, (_, new_module_list) in plan['overflow'].items():
+            self.state[f"{module_name.lower()}_module"] = new_module_list
+        if refreshed:
+            self._last_full_refresh = time.monotonic()
+        self.frames_suppressed += plan['suppressed']
+        if plan['frames']:
             self.save_state()
-            return True
-        else:
-            # Partial failure: at least try to restore previous values (best-effort)
-            print(f"⚠️  Partial failure while setting {currency_name}. Attempting rollback...")
-            # Rollback main
-            try:
-                rollback_main_cmd = f"{currency_code}{prev_main}"
-                dbg(f"Rollback main: {rollback_main_cmd}")
-                self.send_command(rollback_main_cmd, retries=send_retries)
-            except Exception as e:
-                dbg(f"Rollback main raised exception: {e}")
-
-            # Rollback overflow module if applicable
-            if module_name:
-                try:
-                    rollback_overflow_cmd = f"{module_name}{prev_module_value}"
-                    dbg(f"Rollback overflow: {rollback_overflow_cmd}")
-                    self.send_command(rollback_overflow_cmd, retries=send_retries)
-                except Exception as e:
-                    dbg(f"Rollback overflow raised exception: {e}")
+        plan['results'].update({c: True for c in plan['mains']})
+        return plan['results']
 
-            print(f"❌ Failed to set {currency_name} atomically (partial failure).")
+    def _report_rate_batch_failure(self, plan, outcomes):
+        """Print the failure; returns True when some frame got through and a rollback is needed."""
+        if not any(outcomes):
+            print(f"❌ Failed to send any frame for {plan['names']}")
             return False
+        # Partial failure: at least try to restore previous values (best-effort)
+        print(f"⚠️  Partial failure while setting {plan['names']}. Attempting rollback...")
+        return True
 
     def get_full_currency_value(self, currency_code):
         main_value = self.state['main_modules'].get(currency_code, '0000')
@@ -357,30 +842,274 @@ class ForexController:
         if self.state.get('last_updated'):
             print(f"\n🕒 Last Updated: {self.state['last_updated']}")
 
-    def reset_all_modules(self):
-        print("\n🔄 Resetting all modules...")
-        success_count = 0
+        stats = self.frame_stats()
+        if stats['frames_sent'] or stats['frames_suppressed']:
+            print(f"📈 Frames: {stats['frames_sent']} sent, {stats['frames_suppressed']} suppressed, "
+                  f"{stats['frames_failed']} failed")
 
-        for code in ALL_CURRENCIES:
-            if self.send_command(f"{code}0000"):
-                self.state['main_modules'][code] = '0000'
-                success_count += 1
+    def close_storage(self):
+        """Flush pending state and the submission journal to disk."""
+        self.state_persister.stop()
+        self.save_submissions()
 
-        for m in OVERFLOW_MODULE_NAMES:
-            if self.send_command(f"{m}0000"):
-                self.state[f"{m.lower()}_module"] = ['0','0','0','0']
-                success_count += 1
 
-        expected = len(ALL_CURRENCIES) + len(OVERFLOW_MODULE_NAMES)
-        if success_count == expected:
-            print(f"✅ All modules reset successfully")
-            self.save_state()
-            return True
-        else:
-            print(f"⚠️  Some modules failed to reset ({success_count}/{expected} successful)")
+class ForexController(BoardController):
+    """BoardController driving one board over a blocking socket with a paced transmit queue."""
+
+    def __init__(self, state_file='forex_state.json', submissions_file='forex_submissions.jsonl',
+                 min_frame_gap=MIN_FRAME_GAP, diff_mode=DIFF_MODE,
+                 force_refresh_interval=FORCE_REFRESH_INTERVAL,
+                 state_flush_interval=STATE_FLUSH_INTERVAL, transmitter_cls=PacedTransmitter):
+        self.client_socket = None
+        self.transmitter = transmitter_cls(lambda: self.client_socket, min_gap=min_frame_gap,
+                                           on_error=self._on_send_error,
+                                           on_frame=lambda frame, ok: self._count_frame(ok, len(frame.msg)))
+        self.supervisor = None
+        self.pending_rates = {}         # rates queued while disconnected (latest value wins, _state_lock)
+        super().__init__(state_file, submissions_file, diff_mode=diff_mode,
+                         force_refresh_interval=force_refresh_interval,
+                         state_flush_interval=state_flush_interval)
+
+    # ---------- network ----------
+    def connect_to_device(self, timeout=5.0, on_connect=None):
+        """
+        (Re)connect to the board. The socket is opened outside _state_lock and
+        published inside it; on_connect (e.g. replay_after_reconnect) runs in the
+        same critical section, before any caller can send on the new socket.
+        """
+        try:
+            if self.client_socket:
+                try:
+                    self.client_socket.close()
+                except Exception:
+                    pass
+                self.client_socket = None
+
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.settimeout(timeout)
+            sock.connect((DEVICE_IP, DEVICE_PORT))
+            enable_keepalive(sock)
+        except socket.error as e:
+            print(f"❌ Failed to connect to the device: {e}")
+            self.client_socket = None
             return False
 
+        with self._state_lock:
+            self.client_socket = sock
+            print(f"🔗 Connected to {DEVICE_IP}:{DEVICE_PORT}")
+            # board may have been power-cycled; don't trust it to show the committed state
+            self._last_full_refresh = None
+            if on_connect is not None:
+                on_connect()
+        return True
+
+    def connect_with_retry(self, max_retries=3, backoff_factor=2):
+        print(f"🔄 Attempting connection with up to {max_retries} retries...")
+        for attempt in range(max_retries):
+            dbg(f"Attempt {attempt+1}/{max_retries}")
+            if self.connect_to_device():
+                return True
+            if attempt < max_retries - 1:
+                wait_time = backoff_factor ** attempt
+                print(f"⏳ Connection failed. Retrying in {wait_time}s...")
+                time.sleep(wait_time)
+            else:
+                print(f"❌ All {max_retries} connection attempts failed")
+        return False
+
+    def queue_command(self, command, terminator="", retries=1, retry_delay=0.15):
+        """
+        Queue a command on the paced transmitter and return its PendingFrame
+        without waiting for it to be written. Returns None if not connected.
+        """
+        if not self.client_socket:
+            print("❌ Not connected to device (socket is None).")
+            return None
+
+        msg = (command + terminator).encode()
+        return self.transmitter.submit(PendingFrame(command, msg, retries, retry_delay))
+
+    def start_supervisor(self, **kwargs):
+        """Connect and stay connected in the background (see ConnectionSupervisor)."""
+        if self.supervisor is None:
+            self.supervisor = ConnectionSupervisor(self, **kwargs)
+        self.supervisor.start()
+        return self.supervisor
+
+    def drop_connection(self, sock=None):
+        """Forget a dead socket (only if it is still the current one)."""
+        sock = sock or self.client_socket
+        if self.client_socket is sock:
+            self.client_socket = None
+        if sock:
+            try:
+                sock.close()
+            except Exception:
+                pass
+
+    def _on_send_error(self, sock):
+        if self.supervisor is not None:
+            self.supervisor.notify_failure()
+
+    def replay_after_reconnect(self):
+        """Push the committed state to a freshly connected board, then any queued rates."""
+        print("🔁 Replaying committed state to device...")
+        with self._state_lock:
+            if not self.refresh_display():
+                return False
+            pending, self.pending_rates = self.pending_rates, {}
+            if pending:
+                print(f"🔁 Applying {len(pending)} rate(s) queued while disconnected...")
+                self.set_currency_rates(pending)
+        return True
+
+    def send_command(self, command, terminator="", retries=1, retry_delay=0.15):
+        """
+        Send a command to the device and wait until it has been written.
+
+        Because the device does not send acknowledgements in your environment,
+        we consider a successful socket.sendall() (no exception) as success.
+        retries: number of attempts (default 1). If >1, will try again on exception.
+        Pacing between frames is handled by the transmitter (min_frame_gap).
+        """
+        frame = self.queue_command(command, terminator, retries=retries, retry_delay=retry_delay)
+        if frame is None:
+            return False
+        return frame.wait()
+
+    def flush(self, timeout=None):
+        """Wait until all queued frames have drained to the device."""
+        return self.transmitter.flush(timeout)
+
+    def refresh_display(self, send_retries=1):
+        """Re-send every committed module value to the device (no state change)."""
+        with self._state_lock:
+            frames = [self.queue_command(f"{code}{self.state['main_modules'].get(code, '0000')}",
+                                         retries=send_retries) for code in ALL_CURRENCIES]
+            for m in OVERFLOW_MODULE_NAMES:
+                value = ''.join(self.state.get(f"{m.lower()}_module", ['0', '0', '0', '0']))
+                frames.append(self.queue_command(f"{m}{value}", retries=send_retries))
+            ok = all(frame and frame.wait() for frame in frames)
+            if ok:
+                self._last_full_refresh = time.monotonic()
+            return ok
+
+    # ---------- atomic update + rollback ----------
+    def set_currency_rate(self, currency_code, rate_value, send_retries=1):
+        """
+        Atomic update: send main module then overflow module.
+        If overflow fails after main succeeded -> attempt rollback by resending
+        previous main and previous overflow values (best-effort).
+        Returns True if final state consistent and saved, False otherwise -
+        including a rate queued while disconnected (it is in pending_rates and
+        set_currency_rates reports it as QUEUED).
+        send_retries: passed to send_command (useful for flaky networks).
+        """
+        outcome = self.set_currency_rates({currency_code: rate_value}, send_retries=send_retries)
+        return outcome[currency_code] is True
+
+    def set_currency_rates(self, rates, send_retries=1):
+        """
+        Atomic batch update for several currencies, e.g. {'A': '12345', 'B': '2345'}.
+
+        All main frames are queued first, then each overflow module (E/G) is
+        sent only once with the final value of every digit in the batch.
+        If any frame fails, every module written so far is rolled back to its
+        previous value (best-effort) and nothing is committed.
+        Returns {currency_code: bool} (all True or all False for valid entries).
+        While the supervisor is reconnecting, valid rates come back as QUEUED
+        (policy 'queue') and are applied once the board is back; QUEUED is a
+        non-empty string, so compare with `is True` / `== QUEUED`, not truthiness.
+        """
+        with self._state_lock:
+            if self.client_socket is None and self.supervisor is not None:
+                return self._queue_or_reject(rates)
+            return self._send_rate_batch(rates, send_retries)
+
+    def _queue_or_reject(self, rates):
+        """While disconnected: hold valid rates for the replay (policy 'queue') or fail them."""
+        if self.supervisor.policy != 'queue':
+            print(f"❌ Not connected; rejected {', '.join(rates)}")
+            return {c: False for c in rates}
+        results = {}
+        for currency_code, rate_value in rates.items():
+            _, _, error = parse_rate_entry(f"{currency_code}{rate_value}")
+            if error:
+                results[currency_code] = False
+                continue
+            self.pending_rates[currency_code] = rate_value
+            results[currency_code] = QUEUED
+        queued = [c for c, r in results.items() if r == QUEUED]
+        if queued:
+            print(f"⏸️  Not connected; queued {', '.join(queued)} until the device reconnects")
+        return results
+
+    def _send_rate_batch(self, rates, send_retries):
+        """Plan, send and commit (or roll back) one batch; the caller holds _state_lock."""
+        # a newer value supersedes one still queued from a disconnect
+        for currency_code in rates:
+            self.pending_rates.pop(currency_code, None)
+        plan = self._plan_rate_batch(rates)
+        if not plan['mains']:
+            return plan['results']
+
+        # 1) Queue main digits, 2) queue each overflow module once
+        sent = [self.queue_command(cmd, retries=send_retries) for cmd, _ in plan['frames']]
+        refresh_frames = None
+        if plan['refresh'] is not None:
+            refresh_frames = [self.queue_command(cmd, retries=send_retries) for cmd in plan['refresh']]
+
+        outcomes = [bool(frame and frame.wait()) for frame in sent]
+
+        # 3) Commit or rollback
+        if all(outcomes):
+            refreshed = refresh_frames is not None and all(f and f.wait() for f in refresh_frames)
+            return self._commit_rate_batch(plan, refreshed)
+
+        if self._report_rate_batch_failure(plan, outcomes):
+            for _, rollback_cmd in plan['frames']:
+                try:
+                    dbg(f"Rollback: {rollback_cmd}")
+                    self.send_command(rollback_cmd, retries=send_retries)
+                except Exception as e:
+                    dbg(f"Rollback raised exception: {e}")
+            print(f"❌ Failed to set {plan['names']} atomically (partial failure).")
+        plan['results'].update({c: False for c in plan['mains']})
+        return plan['results']
+
+    def reset_all_modules(self):
+        print("\n🔄 Resetting all modules...")
+        success_count = 0
+        with self._state_lock:
+            # queue every frame up front so they drain back-to-back at the device pace
+            frames = [(code, self.queue_command(f"{code}0000")) for code in ALL_CURRENCIES]
+            overflow_frames = [(m, self.queue_command(f"{m}0000")) for m in OVERFLOW_MODULE_NAMES]
+
+            for code, frame in frames:
+                if frame and frame.wait():
+                    self.state['main_modules'][code] = '0000'
+                    success_count += 1
+
+            for m, frame in overflow_frames:
+                if frame and frame.wait():
+                    self.state[f"{m.lower()}_module"] = ['0','0','0','0']
+                    success_count += 1
+
+            expected = len(ALL_CURRENCIES) + len(OVERFLOW_MODULE_NAMES)
+            if success_count == expected:
+                print(f"✅ All modules reset successfully")
+                self.save_state()
+                return True
+            else:
+                print(f"⚠️  Some modules failed to reset ({success_count}/{expected} successful)")
+                return False
+
     def close_connection(self):
+        if self.supervisor is not None:
+            self.supervisor.stop()
+        # let queued frames drain before tearing down the socket
+        self.transmitter.flush(timeout=5.0)
+        self.transmitter.stop()
         if self.client_socket:
             try:
                 self.client_socket.close()
@@ -389,14 +1118,43 @@ class ForexController:
             self.client_socket = None
             print("🔌 Connection closed.")
 
+    def shutdown(self):
+        """Close the device connection and flush pending state to disk."""
+        self.close_connection()
+        self.close_storage()
+
 
 # ---------- CLI main ----------
+def parse_rate_entry(entry):
+    """
+    Validate one '<A-D,F><3-5 digits>' entry (already stripped and upper-cased).
+    Returns (currency_code, rate_digits, None) or (None, None, error_message).
+    """
+    if len(entry) < 4 or len(entry) > 6:
+        print(f"❌ Invalid format for '{entry}'. Use: <A-D,F><3-5 digits>")
+        return None, None, 'Invalid format'
+
+    currency_code = entry[0]
+    rate_digits = entry[1:]
+
+    if currency_code not in ALL_CURRENCIES:
+        print(f"❌ Invalid currency code in '{entry}'. Use A, B, C, D or F")
+        return None, None, 'Invalid currency code'
+
+    if not rate_digits.isdigit():
+        print(f"❌ Rate must contain only digits in '{entry}'")
+        return None, None, 'Non-digit characters'
+
+    return currency_code, rate_digits, None
+
+
 def main():
     controller = ForexController()
 
-    # Connect to device (if available). If device doesn't exist, user can still use 'status' and local state.
-    if not controller.connect_with_retry():
-        print("💥 Could not establish connection to forex device. You can still operate locally (status/reset will attempt sends).")
+    # Connect to device in the background. Until it is reachable, updates are queued
+    # (DISCONNECTED_POLICY) and 'status' works on the local state.
+    print(f"🔄 Connecting to {DEVICE_IP}:{DEVICE_PORT} in the background...")
+    controller.start_supervisor()
 
     try:
         print("\n🚀 === Forex Rate Controller (5 Currencies + 2 Overflow Modules E & G) ===")
@@ -434,44 +1192,45 @@ def main():
             # Track results for logging
             results = []
             all_success = True
+            batch = {}
+            pending = []
 
             for entry in entries:
-                if len(entry) < 4 or len(entry) > 6:
-                    print(f"❌ Invalid format for '{entry}'. Use: <A-D,F><3-5 digits>")
-                    results.append({'entry': entry, 'success': False, 'error': 'Invalid format'})
-                    all_success = False
-                    continue
-
-                currency_code = entry[0]
-                rate_digits = entry[1:]
-
-                if currency_code not in ALL_CURRENCIES:
-                    print(f"❌ Invalid currency code in '{entry}'. Use A, B, C, D or F")
-                    results.append({'entry': entry, 'success': False, 'error': 'Invalid currency code'})
+                currency_code, rate_digits, error = parse_rate_entry(entry)
+                if error:
+                    results.append({'entry': entry, 'success': False, 'error': error})
                     all_success = False
                     continue
 
-                if not rate_digits.isdigit():
-                    print(f"❌ Rate must contain only digits in '{entry}'")
-                    results.append({'entry': entry, 'success': False, 'error': 'Non-digit characters'})
-                    all_success = False
-                    continue
-
-                # Set the currency rate (atomic+rollback) - you can pass send_retries if desired
-                success = controller.set_currency_rate(currency_code, rate_digits, send_retries=1)
+                # Collect for one atomic batch (latest value wins per currency)
+                batch[currency_code] = rate_digits
+                pending.append((len(results), currency_code))
                 results.append({
                     'entry': entry,
                     'currency': CURRENCY_NAMES[currency_code],
-                    'success': success,
-                    'error': None if success else 'Failed to set rate'
+                    'success': False,
+                    'error': None
                 })
-                if not success:
-                    all_success = False
+
+            # Set all rates in one batch (atomic+rollback) - you can pass send_retries if desired
+            if batch:
+                outcome = controller.set_currency_rates(batch, send_retries=1)
+                for idx, currency_code in pending:
+                    success = outcome.get(currency_code, False)
+                    if success == QUEUED:
+                        results[idx]['queued'] = True
+                        continue
+                    results[idx]['success'] = success
+                    results[idx]['error'] = None if success else 'Failed to set rate'
+                    if not success:
+                        all_success = False
 
             # Log the entire submission
             controller.log_submission(user_input, entries, results)
 
-            if all_success:
+            if any(r.get('queued') for r in results):
+                print("⏸️  Queued rate(s) will be sent once the device reconnects.")
+            elif all_success:
                 print("✅ All currency rates updated successfully.")
             else:
                 print("⚠️  Some entries failed to update. See messages above.")
@@ -479,7 +1238,7 @@ def main():
     except KeyboardInterrupt:
         print("\n\n⚡ Interrupted by user")
     finally:
-        controller.close_connection()
+        controller.shutdown()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Throughput / latency benchmark for ForexController.
+
+Drives a real ForexController (state file + submission journal in a temp dir)
+against the local board simulator and reports, per scenario:
+ - updates per second and frames per second
+ - set_currency_rate(s) latency p50 / p90 / p99 / max (includes state + journal I/O)
+ - frames and bytes on the wire, frames suppressed by diff mode, state file writes
+
+Scenarios:
+ - single:   one currency per call, like typing 'A12345'
+ - batch:    comma-separated input like main() parses ('A12345,B23456,...')
+ - rollback: batches where overflow frames are made to fail, exercising rollback
+
+Usage:
+    python Forex_345_digit_benchmark.py --iterations 200 --frame-gap 0.0
+    python Forex_345_digit_benchmark.py --scenario batch --diff-mode --json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import Forex_345_digit_backend_final as forex
+from Forex_345_digit_backend_final import (
+    ForexController, PacedTransmitter, ALL_CURRENCIES, parse_rate_entry
+)
+from Forex_345_digit_simulator import ForexSimulator
+
+SCENARIOS = ('single', 'batch', 'rollback')
+
+
+class _FailingTransmitter(PacedTransmitter):
+    """Fails every `fail_every`-th overflow frame to drive the rollback path."""
+
+    def __init__(self, *args, fail_every=2, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fail_every = fail_every
+        self._overflow_frames = 0
+
+    def _write(self, frame):
+        if frame.command[0] in forex.OVERFLOW_MODULE_NAMES:
+            self._overflow_frames += 1
+            if self._overflow_frames % self.fail_every == 0:
+                self.frames_failed += 1
+                return False
+        return super()._write(frame)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def random_rate(rng):
+    return str(rng.randint(100, 99999))
+
+
+def make_inputs(scenario, iterations, rng):
+    """Raw CLI-style inputs for a scenario."""
+    inputs = []
+    for _ in range(iterations):
+        if scenario == 'single':
+            inputs.append(f"{rng.choice(ALL_CURRENCIES)}{random_rate(rng)}")
+        else:
+            codes = rng.sample(ALL_CURRENCIES, rng.randint(2, len(ALL_CURRENCIES)))
+            inputs.append(','.join(f"{c}{random_rate(rng)}" for c in codes))
+    return inputs
+
+
+def run_scenario(scenario, iterations=100, frame_gap=0.0, device_delay=0.0, diff_mode=False,
+                 state_flush_interval=forex.STATE_FLUSH_INTERVAL, repeat_ratio=0.0, seed=1):
+    rng = random.Random(seed)
+    workdir = tempfile.mkdtemp(prefix='forex-bench-')
+    saved_target = (forex.DEVICE_IP, forex.DEVICE_PORT, forex.DEBUG)
+    forex.DEBUG = False
+    sim = ForexSimulator(frame_delay=device_delay)
+    # the controller's progress prints would dominate the measurement
+    quiet = contextlib.ExitStack()
+    quiet.enter_context(contextlib.redirect_stdout(quiet.enter_context(open(os.devnull, 'w'))))
+    try:
+        forex.DEVICE_IP, forex.DEVICE_PORT = sim.start()
+        controller = ForexController(os.path.join(workdir, 'forex_state.json'),
+                                     os.path.join(workdir, 'forex_submissions.jsonl'),
+                                     min_frame_gap=frame_gap, diff_mode=diff_mode,
+                                     state_flush_interval=state_flush_interval,
+                                     transmitter_cls=_FailingTransmitter if scenario == 'rollback'
+                                     else PacedTransmitter)
+        if not controller.connect_to_device():
+            raise RuntimeError("could not connect to the simulator")
+
+        inputs = make_inputs(scenario, iterations, rng)
+        latencies = []
+        updates = 0
+        last = None
+        start = time.perf_counter()
+        for user_input in inputs:
+            if last is not None and rng.random() < repeat_ratio:
+                user_input = last  # feed re-pushing the same rates
+            last = user_input
+
+            entries = [e.strip() for e in user_input.split(',') if e.strip()]
+            batch = {}
+            for entry in entries:
+                currency_code, rate_digits, error = parse_rate_entry(entry)
+                if not error:
+                    batch[currency_code] = rate_digits
+
+            t0 = time.perf_counter()
+            outcome = controller.set_currency_rates(batch)
+            controller.log_submission(user_input, entries,
+                                      [{'entry': f"{c}{v}", 'success': outcome.get(c, False)}
+                                       for c, v in batch.items()])
+            latencies.append(time.perf_counter() - t0)
+            updates += sum(1 for c in batch if outcome.get(c))  # applied, not just attempted
+
+        controller.flush()
+        elapsed = time.perf_counter() - start
+        stats = controller.frame_stats()
+        controller.shutdown()
+        time.sleep(0.05)  # let the simulator read the tail of the stream
+
+        return {
+            'scenario': scenario,
+            'iterations': iterations,
+            'updates': updates,
+            'elapsed_s': elapsed,
+            'updates_per_s': updates / elapsed if elapsed else 0.0,
+            'frames_per_s': stats['frames_sent'] / elapsed if elapsed else 0.0,
+            'latency_ms': {
+                'p50': percentile(latencies, 50) * 1000,
+                'p90': percentile(latencies, 90) * 1000,
+                'p99': percentile(latencies, 99) * 1000,
+                'max': max(latencies) * 1000 if latencies else 0.0,
+            },
+            'frames_sent': stats['frames_sent'],
+            'frames_failed': stats['frames_failed'],
+            'frames_suppressed': stats['frames_suppressed'],
+            'bytes_on_wire': stats['bytes_sent'],
+            'device_frames_applied': sim.stats['applied'],
+            'state_writes': controller.state_persister.writes,
+        }
+    finally:
+        quiet.close()
+        sim.stop()
+        forex.DEVICE_IP, forex.DEVICE_PORT, forex.DEBUG = saved_target
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_report(result):
+    lat = result['latency_ms']
+    print(f"\n📊 {result['scenario']}: {result['updates']} updates in {result['elapsed_s']:.3f}s")
+    print(f"   throughput : {result['updates_per_s']:.1f} updates/s, {result['frames_per_s']:.1f} frames/s")
+    print(f"   latency ms : p50={lat['p50']:.2f} p90={lat['p90']:.2f} p99={lat['p99']:.2f} max={lat['max']:.2f}")
+    print(f"   wire       : {result['frames_sent']} frames ({result['frames_failed']} failed, "
+          f"{result['frames_suppressed']} suppressed), {result['bytes_on_wire']} bytes")
+    print(f"   disk       : {result['state_writes']} state file writes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ForexController throughput/latency benchmark")
+    parser.add_argument('--scenario', choices=SCENARIOS + ('all',), default='all')
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--frame-gap', type=float, default=0.0, help="controller min_frame_gap (s)")
+    parser.add_argument('--device-delay', type=float, default=0.0, help="simulated per-frame device time (s)")
+    parser.add_argument('--diff-mode', action='store_true')
+    parser.add_argument('--repeat-ratio', type=float, default=0.0,
+                        help="probability an input repeats the previous one (feed re-push)")
+    parser.add_argument('--state-flush-interval', type=float, default=forex.STATE_FLUSH_INTERVAL,
+                        help="0 -> write state synchronously on every update")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    args = parser.parse_args()
+
+    scenarios = SCENARIOS if args.scenario == 'all' else (args.scenario,)
+    results = [run_scenario(s, args.iterations, args.frame_gap, args.device_delay, args.diff_mode,
+                            args.state_flush_interval or None, args.repeat_ratio, args.seed)
+               for s in scenarios]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            print_report(result)
+
+
+if __name__ == "__main__":
+    main()
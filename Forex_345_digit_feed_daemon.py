@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Headless rate-feed daemon for the Forex board.
+
+Behavior:
+ - takes rate updates from a local source instead of the input() prompt:
+     * a watched file         (--watch-file rates.txt, re-read whenever it changes)
+     * a UNIX socket          (--unix-socket /tmp/forex.sock, one line per update)
+     * a small HTTP endpoint  (--http 127.0.0.1:8080, POST /rates)
+   every update uses the CLI syntax, e.g. 'A12345,B2345' (the HTTP endpoint also
+   accepts a JSON object like {"A": "12345", "B": "2345"})
+ - entries are validated with the same rules as the CLI loop (parse_rate_entry)
+ - updates are coalesced per currency (latest value wins) while the previous batch
+   is still on the wire, so a burst collapses into one set_currency_rates() call
+ - the controller runs with the background connection supervisor and diff mode on,
+   so re-pushed identical rates cost no frames
+
+Usage:
+    python Forex_345_digit_feed_daemon.py --http 127.0.0.1:8080
+    curl -d 'A12345,B2345' http://127.0.0.1:8080/rates
+"""
+
+import argparse
+import json
+import os
+import signal
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from Forex_345_digit_backend_final import ForexController, CURRENCY_NAMES, QUEUED, dbg, parse_rate_entry
+
+WATCH_POLL_INTERVAL = 0.5
+
+
+def parse_rate_update(text):
+    """
+    Validate a feed update ('A12345,B2345').
+    Returns ({currency_code: rate_digits}, [(entry, error), ...]).
+    """
+    rates = {}
+    rejected = []
+    for entry in (e.strip() for e in text.strip().upper().split(',')):
+        if not entry:
+            continue
+        currency_code, rate_digits, error = parse_rate_entry(entry)
+        if error:
+            rejected.append((entry, error))
+        else:
+            rates[currency_code] = rate_digits
+    return rates, rejected
+
+
+def submission_result(currency_code, rate_digits, outcome):
+    """Journal entry for one rate; QUEUED rates are neither a success nor a failure yet."""
+    if outcome == QUEUED:
+        return {'entry': f"{currency_code}{rate_digits}", 'currency': CURRENCY_NAMES[currency_code],
+                'success': False, 'queued': True, 'error': None}
+    return {'entry': f"{currency_code}{rate_digits}", 'currency': CURRENCY_NAMES[currency_code],
+            'success': outcome, 'error': None if outcome else 'Failed to set rate'}
+
+
+class RateCoalescer:
+    """
+    Latest-value-wins buffer between the feed sources and the controller.
+
+    submit() only records the newest rate per currency; a single applier thread
+    drains whatever accumulated into one atomic set_currency_rates() batch.
+    """
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.received = 0
+        self.applied_batches = 0
+        self.coalesced = 0
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="forex-feed-apply", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5.0)
+
+    def submit(self, rates):
+        if not rates:
+            return
+        with self._cond:
+            self.received += len(rates)
+            self.coalesced += sum(1 for c in rates if c in self._pending)
+            self._pending.update(rates)
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                if self._stopped and not self._pending:
+                    return
+                batch, self._pending = self._pending, {}
+
+            entries = [f"{c}{v}" for c, v in batch.items()]
+            dbg(f"Applying feed batch: {','.join(entries)}")
+            outcome = self.controller.set_currency_rates(batch)
+            self.applied_batches += 1
+            results = [submission_result(c, v, outcome.get(c, False)) for c, v in batch.items()]
+            self.controller.log_submission(','.join(entries), entries, results)
+
+
+# ---------- sources ----------
+class FileWatcher(threading.Thread):
+    """Re-reads `path` whenever its mtime/size changes and submits its content."""
+
+    def __init__(self, path, coalescer, poll_interval=WATCH_POLL_INTERVAL):
+        super().__init__(name="forex-feed-file", daemon=True)
+        self.path = path
+        self.coalescer = coalescer
+        self.poll_interval = poll_interval
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        last = None
+        while not self._stopped.is_set():
+            try:
+                st = os.stat(self.path)
+                signature = (st.st_mtime_ns, st.st_size)
+                if signature != last:
+                    last = signature
+                    with open(self.path, 'r') as f:
+                        text = ','.join(line.strip() for line in f if line.strip())
+                    rates, rejected = parse_rate_update(text)
+                    for entry, error in rejected:
+                        print(f"⚠️  {self.path}: rejected '{entry}' ({error})")
+                    self.coalescer.submit(rates)
+            except FileNotFoundError:
+                last = None
+            except OSError as e:
+                print(f"⚠️  Could not read {self.path}: {e}")
+            self._stopped.wait(self.poll_interval)
+
+
+class _UnixLineHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw in self.rfile:
+            rates, rejected = parse_rate_update(raw.decode('utf-8', 'replace'))
+            self.server.coalescer.submit(rates)
+            reply = {'accepted': sorted(rates), 'rejected': [{'entry': e, 'error': err} for e, err in rejected]}
+            self.wfile.write((json.dumps(reply) + '\n').encode())
+
+
+class UnixFeedServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, coalescer):
+        if os.path.exists(path):
+            os.remove(path)
+        super().__init__(path, _UnixLineHandler)
+        self.coalescer = coalescer
+
+
+class _HttpFeedHandler(BaseHTTPRequestHandler):
+    def _reply(self, status, payload):
+        body = (json.dumps(payload) + '\n').encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/rates':
+            return self._reply(404, {'error': 'not found'})
+        length = int(self.headers.get('Content-Length') or 0)
+        text = self.rfile.read(length).decode('utf-8', 'replace')
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            try:
+                payload = json.loads(text)
+                text = ','.join(f"{k}{v}" for k, v in payload.items())
+            except (ValueError, AttributeError):
+                return self._reply(400, {'error': 'expected a JSON object like {"A": "12345"}'})
+        rates, rejected = parse_rate_update(text)
+        self.server.coalescer.submit(rates)
+        self._reply(202 if rates else 400, {
+            'accepted': sorted(rates),
+            'rejected': [{'entry': e, 'error': err} for e, err in rejected],
+        })
+
+    def do_GET(self):
+        if self.path.rstrip('/') != '/rates':
+            return self._reply(404, {'error': 'not found'})
+        controller = self.server.coalescer.controller
+        self._reply(200, {
+            'rates': {c: controller.get_full_currency_value(c) for c in CURRENCY_NAMES},
+            'last_updated': controller.state.get('last_updated'),
+            'frames': controller.frame_stats(),
+        })
+
+    def log_message(self, fmt, *args):
+        dbg(f"HTTP {self.address_string()} {fmt % args}")
+
+
+class HttpFeedServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, coalescer):
+        super().__init__(address, _HttpFeedHandler)
+        self.coalescer = coalescer
+
+
+# ---------- main ----------
+def main():
+    parser = argparse.ArgumentParser(description="Headless Forex rate-feed daemon")
+    parser.add_argument('--watch-file', help="file holding the current rates ('A12345,B2345' or one per line)")
+    parser.add_argument('--unix-socket', help="path of a UNIX socket accepting one update per line")
+    parser.add_argument('--http', metavar='HOST:PORT', help="serve POST/GET /rates on this address")
+    parser.add_argument('--no-diff', action='store_true', help="send every frame even if unchanged")
+    parser.add_argument('--policy', choices=('queue', 'reject'), default='queue',
+                        help="what to do with updates while the board is disconnected")
+    args = parser.parse_args()
+
+    if not (args.watch_file or args.unix_socket or args.http):
+        parser.error("give at least one of --watch-file, --unix-socket, --http")
+
+    controller = ForexController(diff_mode=not args.no_diff)
+    controller.start_supervisor(policy=args.policy)
+    coalescer = RateCoalescer(controller)
+    coalescer.start()
+
+    stoppers = []
+    if args.watch_file:
+        watcher = FileWatcher(args.watch_file, coalescer)
+        watcher.start()
+        stoppers.append(watcher.stop)
+        print(f"👀 Watching {args.watch_file}")
+    servers = []
+    if args.unix_socket:
+        servers.append((UnixFeedServer(args.unix_socket, coalescer), f"unix:{args.unix_socket}"))
+    if args.http:
+        host, port = args.http.rsplit(':', 1)
+        servers.append((HttpFeedServer((host, int(port)), coalescer), f"http://{args.http}/rates"))
+    for server, label in servers:
+        threading.Thread(target=server.serve_forever, name=f"forex-feed-{label}", daemon=True).start()
+        stoppers.append(server.shutdown)
+        print(f"📡 Listening on {label}")
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        while not stop.is_set():
+            stop.wait(1.0)
+    except KeyboardInterrupt:
+        print("\n\n⚡ Interrupted by user")
+    finally:
+        for stopper in stoppers:
+            stopper()
+        coalescer.stop()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+        print(f"📈 Feed: {coalescer.received} updates received, {coalescer.coalesced} coalesced, "
+              f"{coalescer.applied_batches} batches applied")
+        controller.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Local TCP stand-in for the Forex LED board.
+
+Behavior:
+ - accepts the same '<letter><4 digits>' frames as the real board
+   (main modules A-D, F and overflow modules E, G), no terminator, no replies
+ - keeps a simulated display that tests can read back (display(), currency_value())
+ - can model the board's per-frame processing time (frame_delay):
+     * strict=False: frames are applied one after another, the board just lags
+     * strict=True:  frames arriving while the board is still busy are dropped
+       (counted in stats['overruns']) - useful to check controller pacing
+ - can inject failures: drop the connection after N frames or with a given
+   probability per frame, and ignore or reset on frames for given modules
+
+Usage:
+    python Forex_345_digit_simulator.py --port 20108 --frame-delay 0.05
+"""
+
+import argparse
+import random
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+from Forex_345_digit_backend_final import (
+    ALL_CURRENCIES, CURRENCY_NAMES, OVERFLOW_MODULE_NAMES, OVERFLOW_POSITIONS
+)
+
+FRAME_LEN = 5
+MODULES = ALL_CURRENCIES + OVERFLOW_MODULE_NAMES
+
+
+class _BoardHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        self.server.simulator._serve(self.request)
+
+
+class _ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class ForexSimulator:
+    def __init__(self, host='127.0.0.1', port=0, frame_delay=0.0, strict=False,
+                 drop_after_frames=None, drop_probability=0.0, seed=None):
+        self.host = host
+        self.port = port
+        self.frame_delay = frame_delay
+        self.strict = strict
+        self.drop_after_frames = drop_after_frames
+        self.drop_probability = drop_probability
+        self.random = random.Random(seed)
+
+        self.modules = {m: '0000' for m in MODULES}
+        self.history = []            # (monotonic_time, frame) for every applied frame
+        self.stats = {
+            'connections': 0, 'frames': 0, 'applied': 0, 'overruns': 0,
+            'bad_bytes': 0, 'drops': 0, 'ignored': 0, 'bytes': 0,
+        }
+        self._fail_modules = {}      # module -> 'ignore' | 'reset'
+        self._busy_until = 0.0
+        self._lock = threading.Lock()
+        self._conns = set()          # accepted controller connections, closed by stop()
+        self._server = None
+        self._thread = None
+
+    # ---------- lifecycle ----------
+    def start(self):
+        self._server = _ThreadingServer((self.host, self.port), _BoardHandler)
+        self._server.simulator = self
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="forex-sim", daemon=True)
+        self._thread.start()
+        return self.host, self.port
+
+    def stop(self):
+        """Stop listening and drop every open connection, like a board that went offline."""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        with self._lock:
+            conns, self._conns = self._conns, set()
+        for conn in conns:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conn.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---------- failure injection ----------
+    def fail_module(self, module, mode='ignore'):
+        """Frames for `module` are silently ignored ('ignore') or reset the connection ('reset')."""
+        if mode not in ('ignore', 'reset'):
+            raise ValueError(f"Unknown failure mode: {mode}")
+        with self._lock:
+            self._fail_modules[module] = mode
+
+    def clear_failures(self):
+        with self._lock:
+            self._fail_modules.clear()
+
+    def power_cycle(self):
+        """Blank the display, as if the board lost power."""
+        with self._lock:
+            self.modules = {m: '0000' for m in MODULES}
+
+    # ---------- display ----------
+    def display(self):
+        with self._lock:
+            return dict(self.modules)
+
+    def currency_value(self, currency_code):
+        """Same folding as ForexController.get_full_currency_value, read from the display."""
+        with self._lock:
+            main_value = self.modules[currency_code]
+            module_name, position = OVERFLOW_POSITIONS.get(currency_code, (None, None))
+            overflow_digit = self.modules[module_name][position] if module_name else '0'
+        return main_value if overflow_digit == '0' else main_value + overflow_digit
+
+    def print_display(self):
+        board = self.display()
+        print("📺 " + "  ".join(f"{CURRENCY_NAMES.get(m, m)}={board[m]}" for m in MODULES))
+
+    # ---------- protocol ----------
+    def _serve(self, conn):
+        with self._lock:
+            if self._server is None:   # accepted just before stop()
+                conn.close()
+                return
+            self.stats['connections'] += 1
+            self._conns.add(conn)
+        try:
+            self._serve_frames(conn)
+        finally:
+            with self._lock:
+                self._conns.discard(conn)
+
+    def _serve_frames(self, conn):
+        conn_frames = 0
+        buf = b''
+        while True:
+            try:
+                data = conn.recv(4096)
+            except OSError:
+                return
+            if not data:
+                return
+            arrived = time.monotonic()
+            with self._lock:
+                self.stats['bytes'] += len(data)
+            buf += data
+
+            while len(buf) >= FRAME_LEN:
+                frame = buf[:FRAME_LEN].decode('ascii', 'replace')
+                if frame[0] not in MODULES or not frame[1:].isdigit():
+                    # resync: skip one byte and try again
+                    buf = buf[1:]
+                    with self._lock:
+                        self.stats['bad_bytes'] += 1
+                    continue
+                buf = buf[FRAME_LEN:]
+                conn_frames += 1
+
+                if self._should_drop(conn_frames):
+                    self._reset(conn)
+                    return
+
+                action = self._apply(frame, arrived)
+                if action == 'reset':
+                    self._reset(conn)
+                    return
+
+    def _should_drop(self, conn_frames):
+        if self.drop_after_frames is not None and conn_frames > self.drop_after_frames:
+            return True
+        return self.drop_probability > 0 and self.random.random() < self.drop_probability
+
+    def _apply(self, frame, arrived):
+        module, value = frame[0], frame[1:]
+        with self._lock:
+            self.stats['frames'] += 1
+            mode = self._fail_modules.get(module)
+            if mode == 'reset':
+                return 'reset'
+            if mode == 'ignore':
+                self.stats['ignored'] += 1
+                return 'ignored'
+            if self.strict and arrived < self._busy_until:
+                self.stats['overruns'] += 1
+                return 'overrun'
+            self.modules[module] = value
+            self.history.append((time.monotonic(), frame))
+            self.stats['applied'] += 1
+            self._busy_until = max(arrived, self._busy_until) + self.frame_delay
+        if not self.strict and self.frame_delay:
+            time.sleep(self.frame_delay)
+        return 'applied'
+
+    def _reset(self, conn):
+        with self._lock:
+            self.stats['drops'] += 1
+        try:
+            # SO_LINGER 0 -> RST instead of FIN, like a board that rebooted
+            conn.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+        except OSError:
+            pass
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Forex board simulator")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=20108)
+    parser.add_argument('--frame-delay', type=float, default=0.0, help="seconds the board needs per frame")
+    parser.add_argument('--strict', action='store_true', help="drop frames that arrive while busy")
+    parser.add_argument('--drop-probability', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    sim = ForexSimulator(args.host, args.port, frame_delay=args.frame_delay, strict=args.strict,
+                         drop_probability=args.drop_probability, seed=args.seed)
+    host, port = sim.start()
+    print(f"🖥️  Forex board simulator listening on {host}:{port} (Ctrl+C to stop)")
+    last = None
+    try:
+        while True:
+            time.sleep(0.5)
+            board = sim.display()
+            if board != last:
+                sim.print_display()
+                last = board
+    except KeyboardInterrupt:
+        print(f"\n📈 {sim.stats}")
+    finally:
+        sim.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+# Flask app serving the wheat species classifier
+import os
+
+import pickle
+
+import threading
+
+import time
+
+import numpy as np
+
+from flask import Flask, render_template, request, jsonify, g, url_for
+
+import assets
+
+from fast_knn import FastKNN
+
+from metrics import Registry
+
+from micro_batcher import MicroBatcher
+
+from prediction_cache import PredictionCache, file_hash
+
+
+# Input features, in the order the model was trained on (see model.py)
+FEATURES = ['compactness', 'kernel_length', 'width', 'asymmetry_coef', 'groove_length']
+
+# Class labels of the seeds dataset
+LABELS = {1 : 'Kama', 2 : 'Rosa', 3 : 'Canadian'}
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MODEL_PATH = os.environ.get('MODEL_PATH', os.path.join(BASE_DIR, 'model.pkl'))
+
+# NumPy-only export of the pipeline (python fast_knn.py model.pkl model_fast.npz).
+# Used instead of model.pkl when present, so workers never import sklearn/pandas.
+FAST_MODEL_PATH = os.environ.get('FAST_MODEL_PATH', os.path.join(BASE_DIR, 'model_fast.npz'))
+
+# Lists searched per query when the export has an approximate (ivf) index;
+# 0 keeps the value chosen at training time (python model.py --index ivf --n-probe N)
+KNN_N_PROBE = int(os.environ.get('KNN_N_PROBE', 0)) or None
+
+# Maximum number of samples accepted by /predict in one request
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 10000))
+
+# Micro-batching of concurrent single-sample requests (needs a threaded worker,
+# e.g. gunicorn --worker-class gthread). MICRO_BATCH_WAIT_MS = 0 disables it.
+MICRO_BATCH_MAX = int(os.environ.get('MICRO_BATCH_MAX', 64))
+MICRO_BATCH_WAIT_MS = float(os.environ.get('MICRO_BATCH_WAIT_MS', 2))
+
+# Prediction cache keyed on the features rounded to their measurement precision
+# (the most decimals each column has in seeds_dataset.csv, e.g. asymmetry 0.7651).
+# PREDICTION_CACHE_SIZE = 0 disables it, PREDICTION_CACHE_TTL = 0 means no expiry.
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 10000))
+PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', 0)) or None
+FEATURE_PRECISION = [4, 3, 3, 4, 3]
+
+# How often (seconds) a background thread checks whether the model file changed
+# on disk and swaps the new model in. 0 disables the watcher.
+MODEL_CHECK_INTERVAL = float(os.environ.get('MODEL_CHECK_INTERVAL', 5))
+
+# Browser caching of static/: the content-hashed images built by `python assets.py`
+# never change under their URL and are cached for a year; other files for
+# STATIC_MAX_AGE seconds, then revalidated against their ETag.
+STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 3600))
+HASHED_MAX_AGE = 365 * 24 * 3600
+
+
+# Serving metrics of this worker, rendered on /metrics. Stages: decode (form or
+# JSON body), validate (feature array), cache (keys and lookups), micro_batch
+# (a single sample waiting for its coalesced model call), impute, neighbors and
+# vote (NumPy model) or impute and model (pickled pipeline), render (result page).
+registry = Registry()
+STAGE_SECONDS = registry.histogram('wheat_stage_duration_seconds',
+                                   'Time spent in each serving stage', ['stage'])
+REQUEST_SECONDS = registry.histogram('wheat_request_duration_seconds',
+                                     'Request latency inside the worker', ['endpoint'])
+REQUESTS = registry.counter('wheat_requests_total', 'Requests served', ['endpoint', 'status'])
+PREDICTIONS = registry.counter('wheat_predictions_total',
+                               'Samples predicted, by where the answer came from', ['source'])
+registry.callback('wheat_cache_entries', 'Predictions held in the cache', lambda: cache.stats()['size'])
+registry.callback('wheat_micro_batches_total', 'Model calls made by the micro-batcher',
+                  lambda: batcher.batches, kind = 'counter')
+registry.callback('wheat_micro_batch_rows_total', 'Samples predicted through the micro-batcher',
+                  lambda: batcher.rows, kind = 'counter')
+registry.callback('wheat_model_reloads_total', 'Models swapped in by the watcher',
+                  lambda: model_reloads, kind = 'counter')
+
+
+def stage(name):
+    """Context manager adding the time spent in its block to the stage's histogram."""
+    return STAGE_SECONDS.labels(name).time()
+
+
+def load_model(path = MODEL_PATH, fast_path = FAST_MODEL_PATH):
+    """Returns a function mapping a 2-D feature array (FEATURES order) to predictions."""
+    if fast_path and os.path.exists(fast_path):
+        # memory-mapped: forked workers share one copy of the training matrix
+        fast = FastKNN.load(fast_path, mmap_mode = 'r', n_probe = KNN_N_PROBE)
+        if fast.features != FEATURES:
+            raise ValueError(f'{fast_path} was exported with features {fast.features}')
+        return lambda rows: fast.predict(rows, timer = stage)
+
+    import pandas as pd
+
+    with open(path, 'rb') as f:
+        pipe = pickle.load(f)
+    preproc, model = pipe[:-1], pipe[-1]
+
+    def predict(rows):
+        with stage('impute'):
+            features = preproc.transform(pd.DataFrame(rows, columns = FEATURES))
+        with stage('model'):
+            return model.predict(features)
+    return predict
+
+
+def model_artifact(path = MODEL_PATH, fast_path = FAST_MODEL_PATH):
+    """The file the model is actually served from."""
+    return fast_path if fast_path and os.path.exists(fast_path) else path
+
+
+def file_signature(path):
+    st = os.stat(path)
+    return (path, st.st_mtime_ns, st.st_size)
+
+
+# The model is loaded once per worker at import time, not per request
+model_predict = load_model()
+model_signature = file_signature(model_artifact())
+
+cache = PredictionCache(maxsize = PREDICTION_CACHE_SIZE, ttl = PREDICTION_CACHE_TTL,
+                        precision = FEATURE_PRECISION)
+cache.bind_model(file_hash(model_artifact()))
+
+_model_lock = threading.Lock()
+_watcher = None
+_watcher_pid = None
+model_reloads = 0
+
+
+def reload_model():
+    """
+    If the model file's content changed, load the new model and swap it in
+    (one reference assignment, so requests see the old or the new model,
+    never a mix) and drop every cached prediction. A file that fails to
+    load leaves the current model serving.
+    """
+    global model_predict, model_signature, model_reloads
+
+    with _model_lock:
+        signature = file_signature(model_artifact())
+        if signature == model_signature:
+            return
+        model_signature = signature
+        new_hash = file_hash(signature[0])
+        if new_hash == cache.model_hash:
+            return
+        try:
+            new_predict = load_model()
+        except Exception as e:
+            app.logger.error('could not load %s, keeping the current model: %s', signature[0], e)
+            return
+        model_predict = new_predict
+        cache.bind_model(new_hash)
+        model_reloads += 1
+
+
+def _watch_model():
+    while True:
+        time.sleep(MODEL_CHECK_INTERVAL)
+        try:
+            reload_model()
+        except OSError as e:
+            # e.g. the file is being replaced right now; try again next round
+            app.logger.warning('model check failed: %s', e)
+
+
+def check_model():
+    """Make sure this process runs the model watcher (started lazily, and again after a fork)."""
+    global _watcher, _watcher_pid
+
+    if MODEL_CHECK_INTERVAL <= 0:
+        return
+    if _watcher is None or _watcher_pid != os.getpid() or not _watcher.is_alive():
+        with _model_lock:
+            if _watcher is None or _watcher_pid != os.getpid() or not _watcher.is_alive():
+                _watcher_pid = os.getpid()
+                _watcher = threading.Thread(target = _watch_model, name = 'model-watcher', daemon = True)
+                _watcher.start()
+
+app = Flask(__name__)
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = STATIC_MAX_AGE
+
+asset_manifest = assets.load_manifest(app.static_folder)
+
+
+@app.template_global()
+def asset_url(name):
+    """URL of the default built variant of a static image, or of the original if it was not built."""
+    entry = asset_manifest.get(name)
+    return url_for('static', filename = entry['src'] if entry else name)
+
+
+@app.template_global()
+def asset_srcset(name, mime = 'image/jpeg'):
+    """`srcset` value listing the resized variants of one type ('' when there are none)."""
+    variants = assets.sized_variants(asset_manifest.get(name, {}), mime)
+    return ', '.join(f"{url_for('static', filename = f)} {w}w" for w, f in variants)
+
+
+class BadRequest(ValueError):
+    pass
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def observe_request(response):
+    endpoint = request.endpoint or 'unmatched'
+    start = g.get('request_start')
+    if start is not None:
+        REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+    REQUESTS.inc(endpoint, str(response.status_code))
+    return response
+
+
+@app.after_request
+def static_cache_headers(response):
+    if request.endpoint == 'static' and assets.is_hashed(request.view_args.get('filename', '')):
+        response.headers['Cache-Control'] = f'public, max-age={HASHED_MAX_AGE}, immutable'
+    return response
+
+
+def to_rows(samples):
+    """
+    Build the (n_samples x 5) feature array from a list of samples. Each sample
+    is either a dict keyed by FEATURES or a list of 5 numbers in FEATURES order.
+    """
+    if not isinstance(samples, list) or not samples:
+        raise BadRequest('expected a non-empty list of samples')
+    if len(samples) > MAX_BATCH_SIZE:
+        raise BadRequest(f'at most {MAX_BATCH_SIZE} samples per request')
+
+    rows = np.empty((len(samples), len(FEATURES)), dtype = np.float64)
+    for i, sample in enumerate(samples):
+        if isinstance(sample, dict):
+            missing = [f for f in FEATURES if f not in sample]
+            if missing:
+                raise BadRequest(f'sample {i} is missing {missing}')
+            values = [sample[f] for f in FEATURES]
+        elif isinstance(sample, (list, tuple)) and len(sample) == len(FEATURES):
+            values = sample
+        else:
+            raise BadRequest(f'sample {i} must be an object with {FEATURES} or a list of '
+                             f'{len(FEATURES)} numbers')
+        try:
+            rows[i] = [np.nan if v is None else float(v) for v in values]
+        except (TypeError, ValueError):
+            raise BadRequest(f'sample {i} has non-numeric values')
+
+    return rows
+
+
+def predict_rows(rows):
+    """One vectorized model call for a 2-D feature array."""
+    return [int(p) for p in model_predict(rows)]
+
+
+batcher = MicroBatcher(predict_rows, max_batch = MICRO_BATCH_MAX,
+                       max_wait = MICRO_BATCH_WAIT_MS / 1000.0)
+
+
+def predict_uncached(rows):
+    """Single samples are coalesced across requests, batches go to the model directly."""
+    if len(rows) == 1 and MICRO_BATCH_WAIT_MS > 0:
+        with stage('micro_batch'):
+            return [batcher.predict_one(rows[0])]
+    return predict_rows(rows)
+
+
+def predict(samples):
+    """Predict a list of samples, answering repeated measurements from the cache."""
+    with stage('validate'):
+        rows = to_rows(samples)
+    check_model()
+    if PREDICTION_CACHE_SIZE <= 0:
+        PREDICTIONS.inc('model', amount = len(rows))
+        return predict_uncached(rows)
+
+    with stage('cache'):
+        model_hash = cache.model_hash
+        keys = [cache.key(row) for row in rows]
+        preds = [cache.get(key) for key in keys]
+        missing = [i for i, p in enumerate(preds) if p is None]
+    PREDICTIONS.inc('cache', amount = len(rows) - len(missing))
+    PREDICTIONS.inc('model', amount = len(missing))
+    if missing:
+        for i, p in zip(missing, predict_uncached(rows[missing])):
+            preds[i] = p
+            cache.put(keys[i], p, model_hash)
+    return preds
+
+
+@app.route('/', methods = ['GET', 'POST'])
+def home():
+    if request.method == 'GET':
+        # the form only changes on deploy: revalidated with its ETag, usually a 304
+        response = app.make_response(render_template('home.html'))
+        response.cache_control.no_cache = True
+        response.add_etag()
+        return response.make_conditional(request)
+
+    try:
+        with stage('decode'):
+            sample = {f : request.form[f] for f in FEATURES}
+        pred = predict([sample])[0]
+    except (KeyError, BadRequest) as e:
+        return render_template('home.html', error = str(e)), 400
+
+    with stage('render'):
+        return render_template('after.html', data = pred)
+
+
+@app.route('/predict', methods = ['POST'])
+def predict_api():
+    """
+    Batch prediction. Body: {"samples": [{"compactness": 0.87, ...}, ...]}
+    (a bare list of samples is accepted too). One model call per request.
+    """
+    with stage('decode'):
+        payload = request.get_json(silent = True)
+        samples = payload.get('samples') if isinstance(payload, dict) else payload
+
+    try:
+        preds = predict(samples)
+    except BadRequest as e:
+        return jsonify(error = str(e)), 400
+
+    return jsonify(predictions = preds, labels = [LABELS.get(p, str(p)) for p in preds])
+
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(cache.stats())
+
+
+@app.route('/metrics')
+def metrics():
+    return app.response_class(registry.render(), content_type = 'text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/model')
+def model_info():
+    return jsonify(artifact = model_signature[0], model_hash = cache.model_hash,
+                   reloads = model_reloads, watch_interval = MODEL_CHECK_INTERVAL)
+
+
+if __name__ == '__main__':
+    app.run(host = '0.0.0.0', port = int(os.environ.get('PORT', 5000)))
@@ -0,0 +1,180 @@
+# Build step for the UI images: compressed, resized copies with content-hashed names in static/dist
+"""
+Every image in IMAGES is re-encoded (progressive JPEG and WebP) at the
+widths it is displayed at, 1x and 2x, and written as
+static/dist/<name>.<width>w.<hash>.<ext>. The hash is taken from the
+encoded bytes, so a changed image gets a new URL and the files can be
+cached by browsers forever (see app.py). static/dist/manifest.json maps
+each source image to its variants; app.py reads it at start-up and falls
+back to the original files when it is missing.
+
+Resizing needs Pillow. Without it the originals are copied under hashed
+names only, which still gives them the long-lived cache headers.
+
+Usage:
+    python assets.py              # (re)build static/dist
+    python assets.py --clean      # also remove files no longer in the manifest
+"""
+import argparse
+
+import hashlib
+
+import io
+
+import json
+
+import os
+
+import sys
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+
+DIST = 'dist'
+
+MANIFEST = 'manifest.json'
+
+# Source image -> widths (CSS px and 2x) it is displayed at; the first one is the default src.
+# home.html stretches wheat3.jpg over the window, after.html shows the others at 400 x 500.
+IMAGES = {'wheat3.jpg' : (1280, 1920, 960),
+          'Kama1.JPG' : (400, 800),
+          'Rosa1.JPG' : (400, 800),
+          'Canadian1.JPG' : (400, 800)}
+
+JPEG_QUALITY = 80
+
+WEBP_QUALITY = 78
+
+# (Pillow format, extension, MIME type, save options)
+FORMATS = [('JPEG', '.jpg', 'image/jpeg',
+            {'quality' : JPEG_QUALITY, 'optimize' : True, 'progressive' : True}),
+           ('WEBP', '.webp', 'image/webp', {'quality' : WEBP_QUALITY, 'method' : 6})]
+
+MIME_TYPES = {'.jpg' : 'image/jpeg', '.jpeg' : 'image/jpeg', '.png' : 'image/png',
+              '.webp' : 'image/webp'}
+
+
+def content_hash(data, length = 10):
+    return hashlib.sha256(data).hexdigest()[:length]
+
+
+def write_hashed(dist_dir, stem, ext, data, width = None):
+    """Write data as <stem>[.<width>w].<hash><ext> (once) and return its file name."""
+    size = f'.{width}w' if width else ''
+    name = f'{stem}{size}.{content_hash(data)}{ext}'
+    path = os.path.join(dist_dir, name)
+    if not os.path.exists(path):
+        tmp = f'{path}.tmp-{os.getpid()}'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return name
+
+
+def encode_variants(image, original, widths):
+    """(width, ext, MIME type, bytes) of every variant of one PIL image."""
+    from PIL import Image
+
+    image = image.convert('RGB')
+    out = []
+    for width in sorted({min(w, image.width) for w in widths}):
+        height = round(image.height * width / image.width)
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for fmt, ext, mime, options in FORMATS:
+            buf = io.BytesIO()
+            resized.save(buf, fmt, **options)
+            data = buf.getvalue()
+            if width == image.width and fmt == 'JPEG' and len(original) <= len(data):
+                # re-encoding at full size can only lose quality here
+                data = original
+            out.append((width, ext, mime, data))
+    return out
+
+
+def build(static_dir = STATIC_DIR, images = IMAGES, clean = False):
+    """Write the variants and the manifest; returns the manifest."""
+    try:
+        from PIL import Image
+    except ImportError:
+        Image = None
+        print('Pillow is not installed: copying the originals under hashed names, without resizing',
+              file = sys.stderr)
+
+    dist_dir = os.path.join(static_dir, DIST)
+    os.makedirs(dist_dir, exist_ok = True)
+
+    manifest = {}
+    for source, widths in images.items():
+        with open(os.path.join(static_dir, source), 'rb') as f:
+            original = f.read()
+        stem, ext = os.path.splitext(source)
+
+        variants = []
+        if Image is None:
+            ext = ext.lower()
+            variants.append({'file' : f'{DIST}/{write_hashed(dist_dir, stem, ext, original)}',
+                             'width' : None, 'type' : MIME_TYPES.get(ext, 'application/octet-stream')})
+        else:
+            with Image.open(io.BytesIO(original)) as image:
+                encoded = encode_variants(image, original, widths)
+            for width, ext, mime, data in encoded:
+                variants.append({'file' : f'{DIST}/{write_hashed(dist_dir, stem, ext, data, width)}',
+                                 'width' : width, 'type' : mime})
+
+        # default src: the first listed width (or the closest one) in the first format
+        jpeg = [v for v in variants if v['type'] == variants[0]['type']]
+        default = min(jpeg, key = lambda v: abs((v['width'] or 0) - widths[0]))
+        manifest[source] = {'src' : default['file'], 'variants' : variants}
+
+    tmp = os.path.join(dist_dir, f'{MANIFEST}.tmp-{os.getpid()}')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent = 2, sort_keys = True)
+    os.replace(tmp, os.path.join(dist_dir, MANIFEST))
+
+    if clean:
+        used = {os.path.basename(v['file']) for entry in manifest.values() for v in entry['variants']}
+        for name in os.listdir(dist_dir):
+            if name != MANIFEST and name not in used:
+                os.remove(os.path.join(dist_dir, name))
+    return manifest
+
+
+def load_manifest(static_dir = STATIC_DIR):
+    """The manifest written by build(), or {} when the assets have not been built."""
+    try:
+        with open(os.path.join(static_dir, DIST, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def is_hashed(filename):
+    """Whether a static file name is a content-hashed build output (safe to cache forever)."""
+    return filename.startswith(f'{DIST}/') and not filename.endswith(MANIFEST)
+
+
+def sized_variants(entry, mime):
+    """(width, file) of the resized variants of one type in a manifest entry, narrowest first."""
+    return sorted((v['width'], v['file']) for v in entry.get('variants', ())
+                  if v['type'] == mime and v['width'])
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Build the resized, content-hashed UI images')
+    parser.add_argument('--static-dir', default = STATIC_DIR)
+    parser.add_argument('--clean', action = 'store_true', help = 'remove stale files from static/dist')
+    args = parser.parse_args(argv)
+
+    manifest = build(args.static_dir, clean = args.clean)
+    for source, entry in sorted(manifest.items()):
+        before = os.path.getsize(os.path.join(args.static_dir, source))
+        after = os.path.getsize(os.path.join(args.static_dir, entry['src']))
+        print(f'{source:16} {before / 1024:7.1f} KB -> {entry["src"]} {after / 1024:7.1f} KB '
+              f'({len(entry["variants"])} variants)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+# Data-cleaning stage for model.py: de-duplication, LOF outlier removal and optional scaling on NumPy arrays
+import numpy as np
+
+from sklearn.neighbors import KDTree, BallTree
+
+
+# Rows per chunk for neighbour queries and statistics (bounds the temporaries)
+CHUNK_ROWS = 65536
+
+NEIGHBOUR_INDEXES = {'kd_tree' : KDTree, 'ball_tree' : BallTree}
+
+
+def first_occurrences(x, y = None):
+    """
+    Sorted indices of the first occurrence of every distinct row of x (with
+    its label, if given). Rows are compared as raw bytes, so it is one
+    vectorized np.unique over a compact key instead of a pandas hash join.
+    """
+    x = np.asarray(x)
+    parts = [np.ascontiguousarray(x).reshape(len(x), -1).view(np.uint8).reshape(len(x), -1)]
+    if y is not None:
+        parts.append(np.ascontiguousarray(y).reshape(len(x), -1).view(np.uint8).reshape(len(x), -1))
+    rows = np.ascontiguousarray(np.hstack(parts))
+    keys = rows.view(np.dtype((np.void, rows.shape[1]))).ravel()
+    _, first = np.unique(keys, return_index = True)
+    return np.sort(first)
+
+
+def column_stats(x, chunk_rows = CHUNK_ROWS):
+    """Per-column mean and standard deviation, accumulated chunk by chunk in float64."""
+    n, mean, m2 = 0, 0.0, 0.0
+    for start in range(0, len(x), chunk_rows):
+        chunk = np.asarray(x[start:start + chunk_rows], dtype = np.float64)
+        c_n = len(chunk)
+        c_mean = chunk.mean(axis = 0)
+        c_m2 = ((chunk - c_mean) ** 2).sum(axis = 0)
+        delta = c_mean - mean
+        total = n + c_n
+        mean = mean + delta * c_n / total
+        m2 = m2 + c_m2 + delta ** 2 * n * c_n / total
+        n = total
+    std = np.sqrt(m2 / n)
+    return mean, np.where(std == 0, 1.0, std)
+
+
+def lof_scores(x, n_neighbors = 20, algorithm = 'kd_tree', leaf_size = 40, chunk_rows = CHUNK_ROWS):
+    """
+    Local outlier factor of every row of x against the others, as
+    LocalOutlierFactor(n_neighbors).fit(x).negative_outlier_factor_ (negated).
+    The neighbour index is built once; queries, reachability distances and
+    local densities are computed chunk by chunk.
+    """
+    n = len(x)
+    k = max(1, min(n_neighbors, n - 1))
+    tree = NEIGHBOUR_INDEXES[algorithm](x, leaf_size = leaf_size)
+
+    dist = np.empty((n, k))
+    ind = np.empty((n, k), dtype = np.intp)
+    for start in range(0, n, chunk_rows):
+        chunk = np.asarray(x[start:start + chunk_rows])
+        d, i = tree.query(chunk, k = k + 1)
+        # drop the query row itself; with exact duplicates it need not come first
+        not_self = i != np.arange(start, start + len(chunk))[:, None]
+        not_self[not_self.all(axis = 1), 0] = False
+        dist[start:start + len(chunk)] = d[not_self].reshape(len(chunk), k)
+        ind[start:start + len(chunk)] = i[not_self].reshape(len(chunk), k)
+
+    k_distance = dist[:, -1]
+    lrd = np.empty(n)
+    for start in range(0, n, chunk_rows):
+        stop = start + chunk_rows
+        reach = np.maximum(dist[start:stop], k_distance[ind[start:stop]])
+        lrd[start:stop] = 1.0 / (reach.mean(axis = 1) + 1e-10)
+
+    lof = np.empty(n)
+    for start in range(0, n, chunk_rows):
+        stop = start + chunk_rows
+        lof[start:stop] = (lrd[ind[start:stop]] / lrd[start:stop, None]).mean(axis = 1)
+    return lof
+
+
+class Cleaner:
+    """
+    Reusable cleaning stage: drops duplicate rows, then rows whose local
+    outlier factor exceeds `threshold` (1.5 is LocalOutlierFactor's
+    contamination = 'auto' cut-off).
+
+    With scale = True the outlier search runs on standardized columns, so no
+    single measurement dominates the distances; the rows returned are always
+    in their original units, because the served pipeline does not scale.
+    """
+
+    def __init__(self, dedupe = True, n_neighbors = 20, algorithm = 'kd_tree', threshold = 1.5,
+                 scale = False, chunk_rows = CHUNK_ROWS):
+        if algorithm not in NEIGHBOUR_INDEXES:
+            raise ValueError(f'unknown neighbour index {algorithm!r}, expected one of '
+                             f'{sorted(NEIGHBOUR_INDEXES)}')
+        self.dedupe = dedupe
+        self.n_neighbors = n_neighbors
+        self.algorithm = algorithm
+        self.threshold = threshold
+        self.scale = scale
+        self.chunk_rows = chunk_rows
+        self.mean_ = None
+        self.scale_ = None
+
+    def keep_index(self, x, y = None):
+        """Sorted indices of the rows of x (2-D array, y 1-D array) that survive cleaning."""
+        keep = first_occurrences(x, y) if self.dedupe else np.arange(len(x))
+        if len(keep) <= 1:
+            return keep
+
+        # one float64 copy of the kept rows for the neighbour index
+        rows = np.asarray(x[keep] if len(keep) < len(x) else x, dtype = np.float64)
+        if self.scale:
+            self.mean_, self.scale_ = column_stats(rows, self.chunk_rows)
+            if np.shares_memory(rows, x):
+                rows = rows.copy()
+            for start in range(0, len(rows), self.chunk_rows):
+                chunk = rows[start:start + self.chunk_rows]
+                chunk -= self.mean_
+                chunk /= self.scale_
+
+        lof = lof_scores(rows, self.n_neighbors, self.algorithm, chunk_rows = self.chunk_rows)
+        return keep[lof <= self.threshold]
+
+    def apply(self, x, y):
+        keep = self.keep_index(x, y)
+        return x[keep], y[keep]
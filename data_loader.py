@@ -0,0 +1,152 @@
+# Loading of the seeds data (seeds_dataset.csv or train.xlsx) through a cached columnar .npy copy
+import hashlib
+
+import json
+
+import os
+
+import numpy as np
+
+import pandas as pd
+
+
+# Column names of train.xlsx and seeds_dataset.csv mapped to the names app.py uses
+COLUMN_NAMES = {'kernel length' : 'kernel_length', 'asymmetry coef' : 'asymmetry_coef',
+                'groove length' : 'groove_length',
+                'lengthOfKernel' : 'kernel_length', 'widthOfKernel' : 'width',
+                'asymmetryCoefficient' : 'asymmetry_coef', 'lengthOfKernelGroove' : 'groove_length',
+                'seedType' : 'variety'}
+
+# Row number of the csv and the two measurements model.py has never used
+DROP_COLUMNS = ['ID', 'area', 'perimeter']
+
+TARGET = 'variety'
+
+MEASUREMENT_DTYPE = np.float32
+TARGET_DTYPE = np.int64
+
+# Bump when the cached layout or the column handling changes
+CACHE_VERSION = 1
+
+CACHE_DIR = os.environ.get('DATA_CACHE_DIR')     # default: .data_cache next to the source
+
+
+def file_sha256(path, block_size = 1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def read_source(path):
+    """
+    Parse the source file with the final column names, the dropped columns
+    never read, measurements as float32 and the variety as int64.
+    """
+    keep = lambda c: COLUMN_NAMES.get(c, c) not in DROP_COLUMNS
+    if path.lower().endswith(('.xlsx', '.xls')):
+        data = pd.read_excel(path, usecols = keep)
+    else:
+        data = pd.read_csv(path, usecols = keep, dtype = MEASUREMENT_DTYPE, engine = 'c')
+    data = data.rename(columns = COLUMN_NAMES)
+
+    features = [c for c in data.columns if c != TARGET]
+    x = np.ascontiguousarray(data[features].to_numpy(dtype = MEASUREMENT_DTYPE).T)
+    y = data[TARGET].to_numpy().astype(TARGET_DTYPE)
+    return features, x, y
+
+
+class DatasetCache:
+    """
+    One directory per source content hash holding the columnar features
+    (x.npy, n_features x n_rows float32, so every column is contiguous), the
+    target (y.npy) and the column names. Later runs memory-map the arrays
+    instead of parsing the source again.
+
+    index.json remembers (mtime, size) -> hash per source, so an unchanged
+    file is not re-hashed either.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, 'index.json')
+
+    def _read_index(self):
+        try:
+            with open(self._index_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def source_hash(self, path):
+        st = os.stat(path)
+        signature = [st.st_mtime_ns, st.st_size]
+        index = self._read_index()
+        entry = index.get(os.path.abspath(path))
+        if entry and entry[:2] == signature:
+            return entry[2]
+
+        digest = file_sha256(path)
+        index[os.path.abspath(path)] = signature + [digest]
+        os.makedirs(self.cache_dir, exist_ok = True)
+        tmp = f'{self._index_path()}.tmp-{os.getpid()}'
+        with open(tmp, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp, self._index_path())
+        return digest
+
+    def entry_dir(self, digest):
+        return os.path.join(self.cache_dir, f'v{CACHE_VERSION}-{digest[:32]}')
+
+    def load(self, digest):
+        """(features, x, y) memory-mapped from the cache, or None on a miss."""
+        entry = self.entry_dir(digest)
+        try:
+            with open(os.path.join(entry, 'columns.json')) as f:
+                features = json.load(f)
+            x = np.load(os.path.join(entry, 'x.npy'), mmap_mode = 'r')
+            y = np.load(os.path.join(entry, 'y.npy'), mmap_mode = 'r')
+        except (OSError, ValueError):
+            return None
+        return features, x, y
+
+    def store(self, digest, features, x, y):
+        # written to a private directory and renamed, so readers never see half an entry
+        entry = self.entry_dir(digest)
+        tmp = f'{entry}.tmp-{os.getpid()}'
+        os.makedirs(tmp, exist_ok = True)
+        np.save(os.path.join(tmp, 'x.npy'), x)
+        np.save(os.path.join(tmp, 'y.npy'), y)
+        with open(os.path.join(tmp, 'columns.json'), 'w') as f:
+            json.dump(features, f)
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            # another process stored the same content first
+            for name in os.listdir(tmp):
+                os.remove(os.path.join(tmp, name))
+            os.rmdir(tmp)
+
+
+def load_dataset(path, cache_dir = None, use_cache = True):
+    """
+    Returns (x, y): the measurements as a float32 DataFrame whose columns are
+    views of the memory-mapped cache, and the variety as a Series.
+    """
+    if use_cache:
+        cache = DatasetCache(cache_dir or CACHE_DIR or
+                             os.path.join(os.path.dirname(os.path.abspath(path)), '.data_cache'))
+        digest = cache.source_hash(path)
+        cached = cache.load(digest)
+        if cached is None:
+            cache.store(digest, *read_source(path))
+            cached = cache.load(digest)
+        features, x, y = cached
+    else:
+        features, x, y = read_source(path)
+
+    return (pd.DataFrame(x.T, columns = features, copy = False),
+            pd.Series(y, name = TARGET, copy = False))
@@ -0,0 +1,340 @@
+# NumPy-only inference for the mean-imputation + KNN pipeline built in model.py
+import os
+
+from contextlib import nullcontext
+
+import struct
+
+import sys
+
+import zipfile
+
+import numpy as np
+
+
+# Rows per chunk when computing query x train distances (bounds memory), fewer
+# when the training matrix is large: at most CHUNK_ELEMENTS query x train x feature values
+CHUNK_ROWS = 1024
+CHUNK_ELEMENTS = 1 << 23
+
+SUPPORTED_METRICS = ('euclidean', 'manhattan', 'chebyshev', 'minkowski')
+
+# Lists probed per query by the approximate (IVF) index when none is configured
+DEFAULT_N_PROBE = 8
+
+
+def _nearest_centroid(X, centroids, chunk_rows = CHUNK_ROWS):
+    c_sq = np.einsum('ij,ij->i', centroids, centroids)
+    out = np.empty(len(X), dtype = np.int64)
+    for start in range(0, len(X), chunk_rows):
+        chunk = X[start:start + chunk_rows]
+        out[start:start + len(chunk)] = (c_sq - 2.0 * chunk @ centroids.T).argmin(axis = 1)
+    return out
+
+
+class IVFIndex:
+    """
+    Approximate neighbour index: the training rows are bucketed by their
+    nearest k-means centroid (an inverted file), and a query is only compared
+    with the rows of the n_probe buckets whose centroids are closest to it.
+    n_probe is the recall knob: n_probe = n_lists searches everything and is exact.
+    """
+
+    def __init__(self, centroids, offsets, rows, n_probe = DEFAULT_N_PROBE):
+        self.centroids = np.asarray(centroids, dtype = np.float64)
+        self.offsets = np.asarray(offsets, dtype = np.int64)
+        self.rows = np.asarray(rows, dtype = np.int64)
+        self.n_probe = int(n_probe)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, fit_X, n_lists = None, n_probe = DEFAULT_N_PROBE, iters = 10, seed = 0,
+              sample_per_list = 64):
+        """k-means (on a sample of at most sample_per_list rows per list) and bucketing."""
+        fit_X = np.asarray(fit_X, dtype = np.float64)
+        n = len(fit_X)
+        n_lists = max(1, min(n, n_lists or int(round(np.sqrt(n)))))
+        rng = np.random.RandomState(seed)
+        sample = fit_X[rng.choice(n, min(n, n_lists * sample_per_list), replace = False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace = False)].copy()
+        for _ in range(iters):
+            assign = _nearest_centroid(sample, centroids)
+            counts = np.bincount(assign, minlength = n_lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+        assign = _nearest_centroid(fit_X, centroids)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength = n_lists))])
+        return cls(centroids, offsets, np.argsort(assign, kind = 'stable'), n_probe)
+
+    def search(self, X, k, distances, n_probe = None):
+        """
+        (distances, indices) of the k closest rows among the probed lists,
+        nearest first. distances(X, ref_rows) gives the query x row matrix.
+        Missing neighbours (fewer than k candidates) have distance inf.
+        """
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        probe = np.argpartition(distances(X, self.centroids), n_probe - 1, axis = 1)[:, :n_probe]
+
+        best_d = np.full((len(X), k), np.inf)
+        best_i = np.zeros((len(X), k), dtype = np.int64)
+        for lst in np.unique(probe):
+            members = self.rows[self.offsets[lst]:self.offsets[lst + 1]]
+            if not len(members):
+                continue
+            q = np.nonzero((probe == lst).any(axis = 1))[0]
+            d = np.hstack([best_d[q], distances(X[q], members)])
+            i = np.hstack([best_i[q], np.broadcast_to(members, (len(q), len(members)))])
+            top = np.argpartition(d, k - 1, axis = 1)[:, :k]
+            best_d[q] = np.take_along_axis(d, top, axis = 1)
+            best_i[q] = np.take_along_axis(i, top, axis = 1)
+
+        order = np.argsort(best_d, axis = 1)
+        return np.take_along_axis(best_d, order, axis = 1), np.take_along_axis(best_i, order, axis = 1)
+
+
+def load_arrays(path, mmap_mode = None):
+    """
+    The arrays of an .npz written by export_pipeline, by name. np.load ignores
+    mmap_mode for .npz files; here the stored (uncompressed) members are
+    memory-mapped in place, so every process serving the same file shares
+    one physical copy of the training matrix through the page cache.
+    """
+    if mmap_mode is None:
+        with np.load(path, allow_pickle = False) as art:
+            return {name : art[name] for name in art.files}
+
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, 'rb') as f:
+        for info in zf.infolist():
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if info.compress_type == zipfile.ZIP_STORED:
+                # skip the member's local header to the start of its .npy data
+                f.seek(info.header_offset + 26)
+                name_len, extra_len = struct.unpack('<HH', f.read(4))
+                f.seek(info.header_offset + 30 + name_len + extra_len)
+                version = np.lib.format.read_magic(f)
+                if version == (1, 0):
+                    shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+                else:
+                    shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+                if len(shape) and 0 not in shape and not dtype.hasobject:
+                    arrays[name] = np.memmap(path, dtype = dtype, mode = mmap_mode, offset = f.tell(),
+                                             shape = shape, order = 'F' if fortran else 'C')
+                    continue
+            with zf.open(info) as member:
+                arrays[name] = np.lib.format.read_array(member, allow_pickle = False)
+    return arrays
+
+
+def export_pipeline(pipe, path, index = None):
+    """
+    Flatten a fitted Pipeline(preproc = ColumnTransformer(...), model = KNeighborsClassifier)
+    into a .npz artifact: imputation means, training matrix, labels, k, metric and weights,
+    plus the arrays of an IVFIndex built on the training matrix if one is given.
+    Only attributes are read, so this works on any pickled pipeline from model.py.
+    """
+    preproc = pipe.named_steps['preproc']
+    knn = pipe.named_steps['model']
+
+    features = []
+    means = []
+    for name, trans, cols in preproc.transformers_:
+        if name == 'remainder' or trans == 'drop' or len(cols) == 0:
+            continue
+        if name != 'num' or getattr(trans, 'strategy', None) != 'mean':
+            raise ValueError(f'cannot export transformer {name!r}: only mean imputation is supported')
+        if np.isnan(trans.statistics_).any():
+            raise ValueError('an all-missing column was dropped by SimpleImputer; cannot export')
+        features.extend(cols)
+        means.extend(trans.statistics_)
+
+    metric = knn.effective_metric_
+    params = knn.effective_metric_params_ or {}
+    p = float(params.get('p', getattr(knn, 'p', 2) or 2))
+    if metric == 'minkowski' and p == 1:
+        metric = 'manhattan'
+    elif metric == 'minkowski' and p == 2:
+        metric = 'euclidean'
+    if metric not in SUPPORTED_METRICS:
+        raise ValueError(f'unsupported metric {metric!r}')
+    if callable(knn.weights) or knn.weights not in ('uniform', 'distance'):
+        raise ValueError(f'unsupported weights {knn.weights!r}')
+
+    extra = {}
+    if index is not None:
+        extra = {'ivf_centroids' : index.centroids, 'ivf_offsets' : index.offsets,
+                 'ivf_rows' : index.rows, 'n_probe' : np.array(index.n_probe)}
+
+    # written next to the target and renamed over it, so a server watching the
+    # file never maps a half-written export (np.savez wants the .npz suffix)
+    tmp = f'{path}.tmp-{os.getpid()}.npz'
+    np.savez(tmp,
+             features = np.array(features),
+             impute_means = np.asarray(means, dtype = np.float64),
+             fit_X = np.ascontiguousarray(knn._fit_X, dtype = np.float64),
+             fit_y = np.asarray(knn._y, dtype = np.int64),
+             classes = np.asarray(knn.classes_),
+             n_neighbors = np.array(knn.n_neighbors),
+             metric = np.array(metric),
+             p = np.array(p),
+             weights = np.array(knn.weights),
+             **extra)
+    os.replace(tmp, path)
+
+
+def _no_timer(stage):
+    return nullcontext()
+
+
+class FastKNN:
+    """
+    Reproduces pipe.predict for the exported pipeline with NumPy only:
+    mean imputation, brute-force k-nearest-neighbour search and the same
+    (weighted) majority vote, ties going to the smallest class as in sklearn.
+    With an IVFIndex the neighbour search is approximate instead.
+    """
+
+    def __init__(self, features, impute_means, fit_X, fit_y, classes, n_neighbors,
+                 metric = 'minkowski', p = 2.0, weights = 'uniform', index = None):
+        self.features = [str(f) for f in features]
+        self.impute_means = np.asarray(impute_means, dtype = np.float64)
+        self.fit_X = np.asarray(fit_X, dtype = np.float64)
+        self.fit_y = np.asarray(fit_y, dtype = np.int64)
+        self.classes = np.asarray(classes)
+        self.n_neighbors = int(n_neighbors)
+        self.metric = str(metric)
+        self.p = float(p)
+        self.weights = str(weights)
+        self.index = index
+
+    @classmethod
+    def load(cls, path, mmap_mode = None, n_probe = None):
+        """
+        mmap_mode = 'r' maps the arrays instead of reading them (see load_arrays).
+        n_probe overrides the recall setting saved with an approximate index.
+        """
+        art = load_arrays(path, mmap_mode)
+        index = None
+        if 'ivf_centroids' in art:
+            index = IVFIndex(art['ivf_centroids'], art['ivf_offsets'], art['ivf_rows'],
+                             n_probe or art['n_probe'].item())
+        return cls(art['features'], art['impute_means'], art['fit_X'], art['fit_y'],
+                   art['classes'], art['n_neighbors'], art['metric'].item(),
+                   art['p'].item(), art['weights'].item(), index)
+
+    def impute(self, X):
+        X = np.array(X, dtype = np.float64, ndmin = 2)
+        missing = np.isnan(X)
+        if missing.any():
+            X[missing] = np.take(self.impute_means, np.nonzero(missing)[1])
+        return X
+
+    def _distances(self, X, ref = None):
+        """Query x reference distances; ref is row numbers of fit_X or a matrix (default: all of fit_X)."""
+        if ref is None:
+            ref = self.fit_X
+        elif ref.ndim == 1:
+            ref = self.fit_X[ref]
+        diff = X[:, None, :] - ref[None, :, :]
+        if self.metric == 'euclidean':
+            return np.sqrt(np.einsum('ijk,ijk->ij', diff, diff))
+        if self.metric == 'manhattan':
+            return np.abs(diff).sum(axis = 2)
+        if self.metric == 'chebyshev':
+            return np.abs(diff).max(axis = 2)
+        return (np.abs(diff) ** self.p).sum(axis = 2) ** (1.0 / self.p)
+
+    def kneighbors(self, X):
+        """(distances, indices) of the n_neighbors closest training rows, nearest first."""
+        k = self.n_neighbors
+        if self.index is not None:
+            return self.index.search(X, k, self._distances)
+        dist = self._distances(X)
+        ind = np.argpartition(dist, k - 1, axis = 1)[:, :k]
+        d = np.take_along_axis(dist, ind, axis = 1)
+        order = np.argsort(d, axis = 1)
+        return np.take_along_axis(d, order, axis = 1), np.take_along_axis(ind, order, axis = 1)
+
+    def vote(self, dist, ind):
+        labels = self.fit_y[ind]
+        if self.weights == 'distance':
+            with np.errstate(divide = 'ignore'):
+                w = 1.0 / dist
+            exact = np.isinf(w)
+            rows = exact.any(axis = 1)
+            w[rows] = exact[rows].astype(np.float64)
+        else:
+            # an approximate search can come back with fewer than k neighbours (inf)
+            w = np.isfinite(dist).astype(np.float64)
+        scores = np.zeros((len(ind), len(self.classes)))
+        np.add.at(scores, (np.arange(len(ind))[:, None], labels), w)
+        return self.classes[scores.argmax(axis = 1)]
+
+    def predict(self, X, timer = None):
+        """timer(stage), if given, returns a context manager timing 'impute', 'neighbors' and 'vote'."""
+        timer = timer or _no_timer
+        with timer('impute'):
+            X = self.impute(X)
+        out = []
+        if self.index is not None:
+            rows = CHUNK_ROWS            # each query is only compared with a few lists
+        else:
+            rows = max(1, min(CHUNK_ROWS, CHUNK_ELEMENTS // self.fit_X.size))
+        for start in range(0, len(X), rows):
+            chunk = X[start:start + rows]
+            with timer('neighbors'):
+                dist, ind = self.kneighbors(chunk)
+            with timer('vote'):
+                out.append(self.vote(dist, ind))
+        return np.concatenate(out) if out else np.empty(0, dtype = self.classes.dtype)
+
+
+def main(argv = None):
+    """
+    python fast_knn.py model.pkl model_fast.npz  -> export and check against pipe.predict
+
+    With --if-knn (the deploy build step) a model the export does not serve - another
+    family, or a KNN trained with --index kd_tree/ball_tree - is left to app.py's
+    pickle path: nothing is written and the exit status is 0.
+    """
+    import pickle
+
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if_knn = '--if-knn' in argv
+    argv = [a for a in argv if a != '--if-knn']
+    if len(argv) != 2:
+        print('usage: python fast_knn.py [--if-knn] <model.pkl> <output.npz>')
+        return 2
+    src, dst = argv
+    with open(src, 'rb') as f:
+        pipe = pickle.load(f)
+    model = pipe.named_steps['model']
+    if if_knn and (not hasattr(model, 'effective_metric_')
+                   or getattr(model, 'algorithm', 'auto') not in ('auto', 'brute')):
+        print(f'{src} is not a brute-force KNN model, not exporting it (app.py serves the pickle)')
+        if os.path.exists(dst):
+            os.remove(dst)
+        return 0
+    export_pipeline(pipe, dst)
+
+    # Check on the training rows, jittered copies of them and a few rows with missing values
+    import pandas as pd
+    fast = FastKNN.load(dst)
+    rng = np.random.RandomState(0)
+    X = np.vstack([fast.fit_X, fast.fit_X + rng.normal(scale = 0.05, size = fast.fit_X.shape)])
+    X[rng.rand(*X.shape) < 0.02] = np.nan
+    expected = pipe.predict(pd.DataFrame(X, columns = fast.features))
+    mismatches = int((fast.predict(X) != expected).sum())
+    print(f'Exported {src} -> {dst} ({len(fast.fit_X)} training rows, k = {fast.n_neighbors}, '
+          f'{fast.metric}, {fast.weights}); {mismatches} mismatches on {len(X)} check rows')
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+# Accuracy / latency benchmark of the neighbour-index backends against the exact KNN search
+"""
+The reference set is the seeds data blown up to --rows rows by jittering
+(per-column noise of --jitter standard deviations); the queries are fresh
+jittered rows. For every backend it reports:
+ - build time of the index
+ - recall@k: share of the exact k nearest neighbours it returns
+ - agreement with the exact predictions, and accuracy against the labels
+ - single-query latency p50 / p99 and batch throughput
+
+Backends: brute (fast_knn, the ground truth), sklearn kd_tree and ball_tree,
+and the approximate ivf index of fast_knn for each --n-probe value.
+
+Usage:
+    python knn_benchmark.py --rows 1000000 --n-probe 1,4,16
+    python knn_benchmark.py --json
+"""
+import argparse
+
+import json
+
+import sys
+
+import time
+
+import numpy as np
+
+from sklearn.neighbors import KNeighborsClassifier
+
+from cleaning import first_occurrences
+
+from data_loader import load_dataset
+
+from fast_knn import FastKNN, IVFIndex, CHUNK_ELEMENTS
+
+
+def synthesize(x, y, n_rows, jitter, rng):
+    pick = rng.randint(0, len(x), n_rows)
+    noise = rng.normal(scale = jitter, size = (n_rows, x.shape[1])) * x.std(axis = 0)
+    return x[pick] + noise, y[pick]
+
+
+def neighbours(backend, X, ref_size):
+    """Neighbour indices in chunks, so brute force on a large reference set fits in memory."""
+    step = max(1, CHUNK_ELEMENTS // ref_size)
+    return np.vstack([backend.kneighbors(X[i:i + step])[1] for i in range(0, len(X), step)])
+
+
+def percentile(values, pct):
+    return float(np.percentile(values, pct)) * 1e3 if len(values) else 0.0
+
+
+class SklearnBackend:
+    """KNeighborsClassifier with a fixed algorithm, behind the FastKNN calls the benchmark uses."""
+
+    def __init__(self, algorithm, fit_X, fit_y, classes, k, metric):
+        self.model = KNeighborsClassifier(n_neighbors = k, metric = metric, algorithm = algorithm)
+        self.model.fit(fit_X, classes[fit_y])
+
+    def kneighbors(self, X):
+        return self.model.kneighbors(X)
+
+    def predict(self, X):
+        return self.model.predict(X)
+
+
+def run_backend(name, backend, build_s, queries, labels, exact_ind, exact_pred, n_single, ref_size):
+    start = time.perf_counter()
+    pred = backend.predict(queries)
+    batch_s = time.perf_counter() - start
+
+    ind = neighbours(backend, queries, ref_size)
+    recall = np.mean([len(np.intersect1d(a, e)) / len(e) for a, e in zip(ind, exact_ind)])
+
+    single = []
+    for row in queries[:n_single]:
+        start = time.perf_counter()
+        backend.predict(row[None, :])
+        single.append(time.perf_counter() - start)
+
+    return {'backend' : name,
+            'build_s' : build_s,
+            'recall_at_k' : float(recall),
+            'agreement' : float(np.mean(pred == exact_pred)),
+            'accuracy' : float(np.mean(pred == labels)),
+            'single_p50_ms' : percentile(single, 50),
+            'single_p99_ms' : percentile(single, 99),
+            'batch_qps' : len(queries) / batch_s if batch_s else 0.0}
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'KNN neighbour-index benchmark')
+    parser.add_argument('--data', default = 'seeds_dataset.csv')
+    parser.add_argument('--rows', type = int, default = 200000, help = 'reference set size')
+    parser.add_argument('--queries', type = int, default = 2000)
+    parser.add_argument('--single', type = int, default = 200, help = 'queries timed one by one')
+    parser.add_argument('--jitter', type = float, default = 0.05)
+    parser.add_argument('--k', type = int, default = 5)
+    parser.add_argument('--metric', default = 'euclidean', choices = ('euclidean', 'manhattan'))
+    parser.add_argument('--n-lists', type = int, default = None, help = 'ivf lists (default: sqrt(rows))')
+    parser.add_argument('--n-probe', default = '1,2,4,8,16', help = 'comma-separated ivf n_probe values')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--json', action = 'store_true', help = 'print results as JSON')
+    args = parser.parse_args(argv)
+
+    x, y = load_dataset(args.data)
+    keep = first_occurrences(x.to_numpy(), y.to_numpy())
+    x, y = x.to_numpy(dtype = np.float64)[keep], y.to_numpy()[keep]
+
+    rng = np.random.RandomState(args.seed)
+    fit_X, fit_labels = synthesize(x, y, args.rows, args.jitter, rng)
+    queries, labels = synthesize(x, y, args.queries, args.jitter, rng)
+    classes, fit_y = np.unique(fit_labels, return_inverse = True)
+
+    exact = FastKNN(list(map(str, range(x.shape[1]))), fit_X.mean(axis = 0), fit_X, fit_y, classes,
+                    args.k, args.metric)
+    exact_ind = neighbours(exact, queries, fit_X.size)
+    exact_pred = exact.predict(queries)
+
+    common = (queries, labels, exact_ind, exact_pred, args.single)
+    results = [run_backend('brute', exact, 0.0, *common, fit_X.size)]
+    for algorithm in ('kd_tree', 'ball_tree'):
+        start = time.perf_counter()
+        backend = SklearnBackend(algorithm, fit_X, fit_y, classes, args.k, args.metric)
+        results.append(run_backend(algorithm, backend, time.perf_counter() - start, *common, 1))
+
+    start = time.perf_counter()
+    index = IVFIndex.build(fit_X, n_lists = args.n_lists, seed = args.seed)
+    build_s = time.perf_counter() - start
+    for n_probe in (int(v) for v in args.n_probe.split(',')):
+        index.n_probe = n_probe
+        approx = FastKNN(exact.features, exact.impute_means, fit_X, fit_y, classes, args.k,
+                         args.metric, index = index)
+        results.append(run_backend(f'ivf/{n_probe}of{index.n_lists}', approx, build_s, *common,
+                                   fit_X.size * n_probe // index.n_lists))
+
+    if args.json:
+        print(json.dumps({'rows' : args.rows, 'queries' : args.queries, 'k' : args.k,
+                          'results' : results}, indent = 2))
+        return 0
+
+    print(f'{args.rows} reference rows, {args.queries} queries, k = {args.k}, {args.metric}')
+    print(f'{"backend":16} {"build s":>8} {"recall":>7} {"agree":>7} {"acc":>7} '
+          f'{"p50 ms":>8} {"p99 ms":>8} {"batch q/s":>10}')
+    for r in results:
+        print(f'{r["backend"]:16} {r["build_s"]:8.2f} {r["recall_at_k"]:7.4f} {r["agreement"]:7.4f} '
+              f'{r["accuracy"]:7.4f} {r["single_p50_ms"]:8.3f} {r["single_p99_ms"]:8.3f} '
+              f'{r["batch_qps"]:10.0f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,202 @@
+# In-process latency histograms and counters, rendered in the Prometheus text format
+import threading
+
+import time
+
+from bisect import bisect_left
+
+
+# Upper bounds (seconds) of the latency buckets: 50 us .. 2.5 s
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra = None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Timer:
+    """Context manager observing the time spent in its block."""
+
+    __slots__ = ('series', 'start')
+
+    def __init__(self, series):
+        self.series = series
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.series.observe(time.perf_counter() - self.start)
+        return False
+
+
+class HistogramSeries:
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)       # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class CounterSeries:
+
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount = 1):
+        with self._lock:
+            self.value += amount
+
+
+class _Metric:
+
+    kind = None
+
+    def __init__(self, name, help, label_names = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _new_series(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        series = self._series.get(values)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(values, self._new_series())
+        return series
+
+    def items(self):
+        with self._lock:
+            return sorted(self._series.items())
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Histogram(_Metric):
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, label_names = (), buckets = DEFAULT_BUCKETS):
+        super().__init__(name, help, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_series(self):
+        return HistogramSeries(self.buckets)
+
+    def time(self, *values):
+        return _Timer(self.labels(*values))
+
+    def render(self):
+        lines = self.header()
+        for values, series in self.items():
+            counts, total, count = series.snapshot()
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, values, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, values)} {total!r}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, values)} {count}')
+        return lines
+
+
+class Counter(_Metric):
+
+    kind = 'counter'
+
+    def _new_series(self):
+        return CounterSeries()
+
+    def inc(self, *values, amount = 1):
+        self.labels(*values).inc(amount)
+
+    def render(self):
+        lines = self.header()
+        for values, series in self.items():
+            lines.append(f'{self.name}{_labels(self.label_names, values)} {series.value}')
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """
+    A gauge or counter read from elsewhere when rendered. `read` returns a
+    number, or a dict of label-value tuples to numbers.
+    """
+
+    def __init__(self, name, help, read, kind = 'gauge', label_names = ()):
+        super().__init__(name, help, label_names)
+        self.read = read
+        self.kind = kind
+
+    def render(self):
+        lines = self.header()
+        value = self.read()
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for values, v in sorted(items):
+            if v is not None:
+                lines.append(f'{self.name}{_labels(self.label_names, values)} {float(v)!r}')
+        return lines
+
+
+class Registry:
+    """
+    The metrics of one process. With several gunicorn workers each keeps its
+    own, and a scrape reads whichever worker answers it.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, label_names = (), buckets = DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, label_names, buckets))
+
+    def counter(self, name, help, label_names = ()):
+        return self._add(Counter(name, help, label_names))
+
+    def callback(self, name, help, read, kind = 'gauge', label_names = ()):
+        return self._add(CallbackMetric(name, help, read, kind, label_names))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,94 @@
+# Micro-batching of concurrent single-sample predictions
+import os
+
+import threading
+
+import time
+
+from collections import deque
+
+import numpy as np
+
+
+class _Pending:
+    """One waiting request: its feature row and, later, its result."""
+
+    __slots__ = ('row', 'result', 'error', 'done')
+
+    def __init__(self, row):
+        self.row = row
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Gathers single-sample requests from concurrent threads for up to
+    `max_wait` seconds (or until `max_batch` rows are waiting), runs one
+    vectorized `predict_fn` on the stacked rows and hands each caller its
+    own result.
+
+    predict_fn takes a 2-D float array (n_rows x n_features) and returns a
+    sequence of n_rows predictions.
+    """
+
+    def __init__(self, predict_fn, max_batch = 64, max_wait = 0.002):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.rows = 0
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        # started lazily (and again after a fork) so it works with gunicorn --preload
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target = self._run, name = 'micro-batcher', daemon = True)
+            self._thread.start()
+
+    def predict_one(self, row, timeout = None):
+        """Queue one feature row and block until its prediction is ready."""
+        item = _Pending(np.asarray(row, dtype = np.float64))
+        with self._cond:
+            self._ensure_thread()
+            self._queue.append(item)
+            self._cond.notify()
+        if not item.done.wait(timeout):
+            raise TimeoutError('prediction timed out')
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            # first request opens the window; wait for more until full or expired
+            deadline = time.monotonic() + self.max_wait
+            while len(self._queue) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            n = min(len(self._queue), self.max_batch)
+            return [self._queue.popleft() for _ in range(n)]
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                preds = self.predict_fn(np.vstack([item.row for item in batch]))
+                for item, pred in zip(batch, preds):
+                    item.result = pred
+            except Exception as e:
+                for item in batch:
+                    item.error = e
+            self.batches += 1
+            self.rows += len(batch)
+            for item in batch:
+                item.done.set()
@@ -1,140 +1,526 @@
 
-# Importing all the necessary libraries
-import os
-
-import optuna
-
-import pickle
-
-import pandas as pd
-
-import numpy as np
-
-import matplotlib.pyplot as plt
+# Training entry point for the wheat species classifier.
+#
+#   python model.py --data seeds_dataset.csv --output model.pkl --trials 50 --seed 69
+#
+# Writes the fitted pipeline to --output and a metadata file next to it
+# (model.pkl -> model.meta.json) with the features, metrics and training time.
 
-import sklearn
-
-import seaborn as sns
-
-from sklearn.model_selection import (train_test_split, cross_val_score, 
-                                    learning_curve)
-
-from sklearn.neighbors import KNeighborsClassifier, LocalOutlierFactor
-
-from sklearn.ensemble import RandomForestClassifier
-
-from sklearn.tree import DecisionTreeClassifier
-
-from xgboost import XGBClassifier
-
-from sklearn.pipeline import Pipeline
-
-from sklearn.impute import SimpleImputer
-
-from sklearn.compose import ColumnTransformer
-
-from sklearn.metrics import (mean_squared_error, classification_report, 
-                             confusion_matrix, f1_score)
-
-from sklearn.preprocessing import MinMaxScaler, StandardScaler, OneHotEncoder
-
-from sklearn.metrics import (make_scorer, accuracy_score, precision_score, 
-                             recall_score, f1_score)
-
-os.chdir('D:\Shrey\iNeuron\Wheat Data Classification\Data Set')
-
-# Importing the data 
-data = pd.read_excel('train.xlsx')
-data
+# Importing all the necessary libraries
+import argparse
 
-# Creating a copy of the data
-data1 = data.copy(deep = True)
-data1
+import json
 
-# Dropping the duplicate values
-data1.drop_duplicates(keep = 'first', inplace = True)
+import hashlib
 
-r_list = ['area', 'perimeter']
-data2 = data1.drop(r_list, axis = 1)
+import os
 
-data2.rename(columns = {'kernel length' : 'kernel_length', 'asymmetry coef' : 'asymmetry_coef',
-                                'groove length' : 'groove_length'}, inplace = True)
+import sys
 
+import math
 
-# Separating input and output variables
-y = data2['variety']
-data2.drop(['variety'], axis = 1, inplace = True)
+import time
 
-# Separating categorical and numerical variables
-num_cols = [cname for cname in data2.columns if data2[cname].dtype in ['int64', 
-                                                                       'float64']]
-cat_cols = [cname for cname in data2.columns if data2[cname].dtype == 'object']
+import tempfile
 
-# Defining preprocessing steps and bunching them into a Pipeline
-num_trans = SimpleImputer(strategy = 'mean')
-cat_trans = Pipeline(steps = [('impute', SimpleImputer(strategy = 'most_frequent')), 
-                              ('encode', OneHotEncoder(handle_unknown = 'ignore'))])
+import multiprocessing as mp
 
-preproc = ColumnTransformer(transformers = [('cat', cat_trans, cat_cols), 
-                                            ('num', num_trans, num_cols)])
+from functools import partial
 
-# Defining model instance
-model = KNeighborsClassifier()
+import optuna
 
-# Final Pipeline which performs preprocessing steps and fits the model
-pipe = Pipeline(steps = [('preproc', preproc), ('model', model)])
+import pickle
 
-# Splitting the data into train and test sets with test size = 20%
-train_x, test_x, train_y, test_y = train_test_split(data2, y, test_size = 0.2, 
-                                                    random_state = 69, stratify = y)
+import numpy as np
 
-# Creating separate copies of train and test sets to apply scaling
-train_x2 = train_x.copy(deep = True)
-test_x2 = test_x.copy(deep = True)
+import sklearn
 
-s_scaler = StandardScaler()
-s_scaler.fit(train_x2)
-s_scaled_train = s_scaler.transform(train_x2)
-s_scaled_test = s_scaler.transform(test_x2)
+from sklearn.model_selection import (train_test_split, cross_validate, StratifiedKFold)
 
-# Removing outliers
-lof = LocalOutlierFactor()
+from sklearn.base import clone
 
-yhat = lof.fit_predict(train_x2)
-mask = yhat != -1
-train_x2, train_y = train_x2[mask], train_y[mask]
+from cleaning import Cleaner, first_occurrences
 
-yhat1 = lof.fit_predict(test_x2)
-mask1 = yhat1 != -1
-test_x2, test_y = test_x2[mask1], test_y[mask1]
+from data_loader import load_dataset, file_sha256
 
+from fast_knn import FastKNN, IVFIndex, export_pipeline, DEFAULT_N_PROBE
 
+from model_candidates import FAMILIES, available_families
 
-# Hyperparameter tuning using Optuna
-def objective(trial):
-    
-    
-    model__n_neighbors = trial.suggest_int('model__n_neighbors', 1, 20)
-    model__metric = trial.suggest_categorical('model__metric', ['euclidean', 'manhattan', 
-                                                                'minkowski'])
-    model__weights = trial.suggest_categorical('model__weights', ['uniform', 'distance'])
-    
-    params = {'model__n_neighbors' : model__n_neighbors, 
-              'model__metric' : model__metric, 
-              'model__weights' : model__weights}
-    
-    pipe.set_params(**params)
-    
-    return np.mean(cross_val_score(pipe, train_x2, train_y, cv = 5, 
-                                        n_jobs = -1, scoring = 'f1_macro'))
+from sklearn.neighbors import KNeighborsClassifier
 
-# Creating a study and performing hyperparameter tuning for 10 trials 
-knn_study = optuna.create_study(direction = 'maximize')
-knn_study.optimize(objective, n_trials = 10)
+from sklearn.pipeline import Pipeline
 
-# Fitting the best hyperparameters to the model
-pipe.set_params(**knn_study.best_params)
-pipe.fit(data2, y)
+from sklearn.impute import SimpleImputer
 
+from sklearn.compose import ColumnTransformer
 
-pickle.dump(pipe, open('model.pkl', 'wb'))
+from sklearn.metrics import accuracy_score, f1_score
+
+from sklearn.preprocessing import OneHotEncoder
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Defaults of the command line flags, also settable from the environment
+DATA_PATH = os.environ.get('DATA_PATH', os.path.join(BASE_DIR, 'seeds_dataset.csv'))
+OUTPUT_PATH = os.environ.get('OUTPUT_PATH', 'model.pkl')
+SEED = int(os.environ.get('SEED', 69))                       # split and sampler seed
+
+# Hyperparameter search settings. The study lives in STUDY_STORAGE, so a rerun
+# resumes it and several processes can work on the same study at once. Only runs
+# on the same setup share a study: STUDY_NAME gets a digest of the data, split
+# seed, outlier removal, CV folds and OBJECTIVE_VERSION appended (see TrainingSet).
+STUDY_NAME = os.environ.get('STUDY_NAME', 'knn_wheat')
+OBJECTIVE_VERSION = 1                                         # bump when objective() or a search space changes
+STUDY_STORAGE = os.environ.get('STUDY_STORAGE', 'sqlite:///optuna_study.db')
+N_TRIALS = int(os.environ.get('N_TRIALS', 10))               # new trials for this run
+TIMEOUT = float(os.environ.get('TIMEOUT', 0)) or None        # seconds, 0 = no limit
+N_WORKERS = int(os.environ.get('N_WORKERS', 1))              # tuning processes
+
+# Parallelism is either across trials (N_WORKERS processes, folds run one by one
+# and can be pruned) or across CV folds (one process, folds on all cores).
+# Never both, so cores are not oversubscribed.
+PARALLELISM = os.environ.get('PARALLELISM', 'trial')         # 'trial' or 'fold'
+PRUNING = os.environ.get('PRUNING', '1') == '1'              # stop hopeless trials early
+CV_FOLDS = 5
+
+# Outlier removal (LOF, 20 neighbours) on each split: neighbour index used and
+# whether distances are measured on standardized columns
+OUTLIER_INDEX = os.environ.get('OUTLIER_INDEX', 'kd_tree')    # 'kd_tree' or 'ball_tree'
+OUTLIER_SCALING = os.environ.get('OUTLIER_SCALING', '0') == '1'
+
+# Neighbour index of the served KNN. 'kd_tree', 'ball_tree' and 'brute' are
+# sklearn's exact searches, built by fit and pickled with the pipeline; 'ivf'
+# is the approximate index of fast_knn, built here and saved in the NumPy
+# export next to the model ('auto' leaves the choice to sklearn). app.py serves
+# the NumPy export (brute force or ivf) when there is one: it is written for
+# 'auto', 'brute' and 'ivf' only, so the tree indexes serve the pickle.
+KNN_INDEX = os.environ.get('KNN_INDEX', 'auto')
+IVF_LISTS = int(os.environ.get('IVF_LISTS', 0)) or None     # default: sqrt(training rows)
+IVF_PROBE = int(os.environ.get('IVF_PROBE', DEFAULT_N_PROBE))
+
+# 'optuna': sample the search space with the study above.
+# 'sweep':  score the whole KNN grid from neighbour lists computed once per fold.
+# 'select': tune every family in MODEL_FAMILIES side by side (one process each,
+#           SELECTION_BUDGET seconds of wall time in total) and keep the one
+#           with the fastest single-sample prediction among those within
+#           F1_TOLERANCE of the best cross-validated macro-F1.
+# 'xgb' is opt-in (MODEL_FAMILIES=knn,rf,tree,xgb): a model.pkl holding it only
+# unpickles where xgboost is installed, and requirements.txt (the web workers)
+# does not include it.
+TUNING_MODE = os.environ.get('TUNING_MODE', 'optuna')
+MODEL_FAMILIES = os.environ.get('MODEL_FAMILIES', 'knn,rf,tree').split(',')
+SELECTION_BUDGET = float(os.environ.get('SELECTION_BUDGET', 120))
+F1_TOLERANCE = float(os.environ.get('F1_TOLERANCE', 0.01))   # macro-F1 traded for speed
+LATENCY_REPEATS = 50                                          # single-row predicts timed
+
+
+# Dropping the duplicate values (measurements and variety both equal). The
+# renames, dropped columns and dtypes are handled by data_loader.
+def prepare(x, y):
+    keep = first_occurrences(x.to_numpy(), y.to_numpy())
+    if len(keep) == len(x):
+        return x, y
+    return x.iloc[keep], y.iloc[keep]
+
+def build_pipeline(x):
+
+    # Separating categorical and numerical variables
+    num_cols = [cname for cname in x.columns if np.issubdtype(x[cname].dtype, np.number)]
+    cat_cols = [cname for cname in x.columns if x[cname].dtype == 'object']
+
+    # Defining preprocessing steps and bunching them into a Pipeline
+    num_trans = SimpleImputer(strategy = 'mean')
+    cat_trans = Pipeline(steps = [('impute', SimpleImputer(strategy = 'most_frequent')),
+                                  ('encode', OneHotEncoder(handle_unknown = 'ignore'))])
+
+    preproc = ColumnTransformer(transformers = [('cat', cat_trans, cat_cols),
+                                                ('num', num_trans, num_cols)])
+
+    # Final Pipeline which performs preprocessing steps and fits the model
+    return Pipeline(steps = [('preproc', preproc), ('model', KNeighborsClassifier())])
+
+
+class TrainingSet:
+    """
+    The split and outlier-filtered data every tuning mode works on, with the
+    unfitted pipeline and the CV folds. Forked tuning workers inherit it.
+    """
+
+    def __init__(self, x, y, seed = SEED, data_sha256 = None):
+        self.pipe = build_pipeline(x)
+        self.seed = seed
+        self.data_sha256 = data_sha256
+
+        # Splitting the row numbers into train and test sets with test size = 20%
+        # (same split as splitting the frames), so rows are only gathered once
+        train_idx, test_idx = train_test_split(np.arange(len(x)), test_size = 0.2,
+                                               random_state = seed, stratify = y)
+
+        # Removing outliers, each split on its own
+        cleaner = Cleaner(dedupe = False, algorithm = OUTLIER_INDEX, scale = OUTLIER_SCALING)
+        values = x.to_numpy()
+        train_idx = train_idx[cleaner.keep_index(values[train_idx])]
+        test_idx = test_idx[cleaner.keep_index(values[test_idx])]
+
+        self.train_x, self.train_y = x.iloc[train_idx], y.iloc[train_idx]
+        self.test_x, self.test_y = x.iloc[test_idx], y.iloc[test_idx]
+
+        # Same folds as cross_val_score(cv = 5) on a classifier, computed once
+        self.folds = list(StratifiedKFold(n_splits = CV_FOLDS).split(self.train_x, self.train_y))
+
+    def study_setup(self, family = 'knn'):
+        """Everything the trial scores of a family depend on."""
+        return {'family' : family, 'data_sha256' : self.data_sha256, 'seed' : self.seed,
+                'outlier_index' : OUTLIER_INDEX, 'outlier_scaling' : OUTLIER_SCALING,
+                'cv_folds' : CV_FOLDS, 'objective_version' : OBJECTIVE_VERSION}
+
+    def study_name(self, family = 'knn'):
+        """STUDY_NAME_<family>_<digest of study_setup>: a changed setup starts a new study."""
+        digest = hashlib.sha256(json.dumps(self.study_setup(family), sort_keys = True).encode())
+        return f'{STUDY_NAME}_{family}_{digest.hexdigest()[:12]}'
+
+    def create_study(self, pruner, family = 'knn'):
+        """Create or resume the family's study, recording its setup on it."""
+        study = optuna.create_study(study_name = self.study_name(family), storage = STUDY_STORAGE,
+                                    direction = 'maximize', load_if_exists = True, pruner = pruner)
+        for key, value in self.study_setup(family).items():
+            study.set_user_attr(key, value)
+        return study
+
+
+# Hyperparameter tuning using Optuna. Mean fit time and per-sample predict
+# time over the folds are stored on the trial next to its macro-F1.
+def objective(trial, ts, family = 'knn', parallel_folds = PARALLELISM == 'fold'):
+
+    make_model, search_space = FAMILIES[family]
+    params = search_space(trial)
+
+    pipe = clone(ts.pipe).set_params(model = make_model(), **params)
+
+    if parallel_folds:
+        cv = cross_validate(pipe, ts.train_x, ts.train_y, cv = ts.folds, n_jobs = -1,
+                            scoring = 'f1_macro')
+        trial.set_user_attr('fit_time_s', float(np.mean(cv['fit_time'])))
+        trial.set_user_attr('predict_us', float(np.mean(cv['score_time']) / len(ts.folds[0][1]) * 1e6))
+        return np.mean(cv['test_score'])
+
+    # Folds one at a time, reporting the running mean so the pruner can stop
+    # a bad configuration after the first folds
+    scores, fit_times, predict_times = [], [], []
+    for step, (tr_idx, va_idx) in enumerate(ts.folds):
+        start = time.perf_counter()
+        fold_pipe = clone(pipe).fit(ts.train_x.iloc[tr_idx], ts.train_y.iloc[tr_idx])
+        fit_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        pred = fold_pipe.predict(ts.train_x.iloc[va_idx])
+        predict_times.append((time.perf_counter() - start) / len(va_idx))
+
+        scores.append(f1_score(ts.train_y.iloc[va_idx], pred, average = 'macro'))
+        trial.report(np.mean(scores), step)
+        if trial.should_prune():
+            raise optuna.TrialPruned()
+
+    trial.set_user_attr('fit_time_s', float(np.mean(fit_times)))
+    trial.set_user_attr('predict_us', float(np.mean(predict_times) * 1e6))
+    return np.mean(scores)
+
+# Prune a trial when its running mean falls below the median of earlier trials
+# at the same fold (from the second fold on, after 5 complete trials)
+def make_pruner(mode):
+    if PRUNING and (PARALLELISM == 'trial' or mode == 'select'):
+        return optuna.pruners.MedianPruner(n_startup_trials = 5, n_warmup_steps = 1)
+    return optuna.pruners.NopPruner()
+
+# Exhaustive KNN grid from precomputed neighbour lists. The features and folds
+# never change, so each metric's distances are computed once per fold and every
+# (n_neighbors, weights) pair is scored by slicing the sorted neighbour lists.
+KNN_GRID = {'model__n_neighbors' : list(range(1, 21)),
+            'model__metric' : ['euclidean', 'manhattan', 'minkowski'],
+            'model__weights' : ['uniform', 'distance']}
+
+def sweep_knn_grid(ts, grid = KNN_GRID):
+
+    # minkowski with the default p = 2 is the euclidean distance
+    effective = {'euclidean' : 'euclidean', 'manhattan' : 'manhattan', 'minkowski' : 'euclidean'}
+    k_max = max(grid['model__n_neighbors'])
+    scores = {}
+
+    for tr_idx, va_idx in ts.folds:
+        x_tr = ts.train_x.iloc[tr_idx].to_numpy(dtype = np.float64)
+        x_va = ts.train_x.iloc[va_idx].to_numpy(dtype = np.float64)
+        y_va = ts.train_y.iloc[va_idx].to_numpy()
+        classes, y_idx = np.unique(ts.train_y.iloc[tr_idx].to_numpy(), return_inverse = True)
+        means = np.nanmean(x_tr, axis = 0)
+
+        neighbours = {}
+        for metric in grid['model__metric']:
+            knn = FastKNN(ts.train_x.columns, means, x_tr, y_idx, classes,
+                          min(k_max, len(x_tr)), effective[metric])
+            if effective[metric] not in neighbours:
+                neighbours[effective[metric]] = knn.kneighbors(knn.impute(x_va))
+            dist, ind = neighbours[effective[metric]]
+
+            for k in grid['model__n_neighbors']:
+                for weights in grid['model__weights']:
+                    knn.weights = weights
+                    pred = knn.vote(dist[:, :k], ind[:, :k])
+                    key = (k, metric, weights)
+                    scores.setdefault(key, []).append(f1_score(y_va, pred, average = 'macro'))
+
+    results = sorted(((np.mean(v), key) for key, v in scores.items()), reverse = True)
+    for score, (k, metric, weights) in results[:5]:
+        print(f'f1_macro = {score:.4f}  n_neighbors = {k}, metric = {metric}, weights = {weights}')
+
+    best_score, (best_k, best_metric, best_weights) = results[0]
+    return ('knn',
+            {'model__n_neighbors' : best_k,
+             'model__metric' : best_metric,
+             'model__weights' : best_weights},
+            float(best_score))
+
+# Each worker loads the shared study from storage and pulls its share of trials.
+# Workers get different sampler seeds, otherwise they would all try the same points.
+def run_worker(ts, study_name, n_trials, timeout, seed, pruner, **objective_args):
+    study = optuna.load_study(study_name = study_name, storage = STUDY_STORAGE, pruner = pruner,
+                              sampler = optuna.samplers.TPESampler(seed = seed))
+    study.optimize(partial(objective, ts = ts, **objective_args), n_trials = n_trials,
+                   timeout = timeout)
+
+def run_study(ts, args):
+
+    # Creating (or resuming) the study and performing hyperparameter tuning
+    pruner = make_pruner(args.mode)
+    study_name = ts.create_study(pruner).study_name
+
+    if PARALLELISM == 'trial' and args.workers > 1 and 'fork' in mp.get_all_start_methods():
+        per_worker = math.ceil(args.trials / args.workers)
+        ctx = mp.get_context('fork')
+        workers = [ctx.Process(target = run_worker,
+                               args = (ts, study_name, per_worker, args.timeout, args.seed + i, pruner))
+                   for i in range(args.workers)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+    else:
+        # no fork (e.g. Windows): start more copies of this script against the same storage instead
+        run_worker(ts, study_name, args.trials, args.timeout, args.seed, pruner)
+
+    knn_study = optuna.load_study(study_name = study_name, storage = STUDY_STORAGE)
+    return 'knn', knn_study.best_params, knn_study.best_value
+
+def served_predictor(family, candidate, index = KNN_INDEX):
+    """
+    What app.py calls for a fitted candidate, on a one-row DataFrame: the NumPy
+    export for KNN (served from model_fast.npz, no sklearn per-call overhead),
+    the pipeline itself for the other families and the tree indexes.
+    """
+    if family != 'knn' or index in ('kd_tree', 'ball_tree'):
+        return candidate.predict
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'candidate_fast.npz')
+        export_pipeline(candidate, path)
+        fast = FastKNN.load(path)
+    return lambda row: fast.predict(row.to_numpy(dtype = np.float64))
+
+def request_latency(ts, predict):
+    """Median seconds for one single-row predict, as a form submission costs."""
+    times = []
+    for i in range(LATENCY_REPEATS):
+        row = ts.test_x.iloc[[i % len(ts.test_x)]]
+        start = time.perf_counter()
+        predict(row)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+# One study per family in the same storage. The families already run in
+# parallel processes, so their folds run one by one.
+def select_model(ts, args):
+
+    pruner = make_pruner(args.mode)
+    families = available_families(MODEL_FAMILIES)
+    parallel = len(families) > 1 and 'fork' in mp.get_all_start_methods()
+    timeout = SELECTION_BUDGET if parallel else SELECTION_BUDGET / len(families)
+
+    jobs = []
+    for i, family in enumerate(families):
+        study_name = ts.create_study(pruner, family).study_name
+        jobs.append(((ts, study_name, args.trials, timeout, args.seed + i, pruner),
+                     {'family' : family, 'parallel_folds' : False}))
+
+    if parallel:
+        ctx = mp.get_context('fork')
+        workers = [ctx.Process(target = run_worker, args = a, kwargs = kw) for a, kw in jobs]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+    else:
+        for a, kw in jobs:
+            run_worker(*a, **kw)
+
+    results = []
+    for family in families:
+        best = optuna.load_study(study_name = ts.study_name(family),
+                                 storage = STUDY_STORAGE).best_trial
+        candidate = clone(ts.pipe).set_params(model = FAMILIES[family][0](), **best.params)
+        candidate.fit(ts.train_x, ts.train_y)
+        results.append({'family' : family,
+                        'params' : best.params,
+                        'f1_macro' : best.value,
+                        'fit_time_s' : best.user_attrs.get('fit_time_s', float('nan')),
+                        'predict_us' : best.user_attrs.get('predict_us', float('nan')),
+                        'request_ms' : request_latency(ts, served_predictor(family, candidate, args.index)) * 1e3,
+                        'test_f1' : f1_score(ts.test_y, candidate.predict(ts.test_x), average = 'macro')})
+
+    best_f1 = max(r['f1_macro'] for r in results)
+    chosen = min((r for r in results if r['f1_macro'] >= best_f1 - F1_TOLERANCE),
+                 key = lambda r: r['request_ms'])
+
+    print(f'{"family":6} {"cv f1":>7} {"test f1":>7} {"fit s":>8} {"us/row":>8} {"req ms":>7}')
+    for r in sorted(results, key = lambda r: -r['f1_macro']):
+        print(f'{r["family"]:6} {r["f1_macro"]:7.4f} {r["test_f1"]:7.4f} {r["fit_time_s"]:8.4f} '
+              f'{r["predict_us"]:8.1f} {r["request_ms"]:7.3f}' + ('  <-' if r is chosen else ''))
+
+    return chosen['family'], chosen['params'], chosen['f1_macro']
+
+
+def metadata_path(output):
+    """model.pkl -> model.meta.json"""
+    return os.path.splitext(output)[0] + '.meta.json'
+
+def fast_model_path(output):
+    """model.pkl -> model_fast.npz, where app.py looks for the NumPy export"""
+    return os.path.splitext(output)[0] + '_fast.npz'
+
+def remove_fast_model(output):
+    """Delete a NumPy export from an earlier run, which app.py would serve instead of output."""
+    if os.path.exists(fast_model_path(output)):
+        os.remove(fast_model_path(output))
+
+def export_knn(pipe, output, args, ts):
+    """
+    Write the NumPy export of a KNN pipeline (with the approximate index if
+    --index ivf) and return what the metadata records about the served index.
+    The export is a brute-force (or ivf) search, so with --index kd_tree or
+    ball_tree nothing is exported and app.py serves the pickled pipeline.
+    """
+    if args.index in ('kd_tree', 'ball_tree'):
+        remove_fast_model(output)
+        return {'type' : args.index, 'model_file' : os.path.basename(output)}
+
+    path = fast_model_path(output)
+    # 'auto' is served by the exact brute-force search of the export
+    info = {'type' : 'ivf' if args.index == 'ivf' else 'brute',
+            'model_file' : os.path.basename(path)}
+    export_pipeline(pipe, path)
+    if args.index == 'ivf':
+        knn = FastKNN.load(path)
+        index = IVFIndex.build(knn.fit_X, n_lists = args.n_lists, n_probe = args.n_probe,
+                               seed = args.seed)
+
+        # share of the exact neighbours the index finds for the held-out rows
+        queries = knn.impute(ts.test_x.to_numpy())
+        exact = knn.kneighbors(queries)[1]
+        knn.index = index
+        approx = knn.kneighbors(queries)[1]
+        recall = np.mean([len(np.intersect1d(a, e)) / len(e) for a, e in zip(approx, exact)])
+
+        export_pipeline(pipe, path, index)
+        info.update(n_lists = index.n_lists, n_probe = index.n_probe, recall_at_k = float(recall))
+    return info
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = 'Train the wheat species classifier')
+    parser.add_argument('--data', default = DATA_PATH,
+                        help = 'seeds_dataset.csv or train.xlsx (default: %(default)s)')
+    parser.add_argument('--cache-dir', default = None,
+                        help = 'where the parsed data is cached (default: .data_cache next to --data)')
+    parser.add_argument('--no-cache', action = 'store_true', help = 'always parse --data')
+    parser.add_argument('--output', default = OUTPUT_PATH,
+                        help = 'where to write the pickled pipeline (default: %(default)s)')
+    parser.add_argument('--trials', type = int, default = N_TRIALS,
+                        help = 'new trials for this run (per family in select mode)')
+    parser.add_argument('--timeout', type = float, default = TIMEOUT,
+                        help = 'tuning time limit in seconds')
+    parser.add_argument('--seed', type = int, default = SEED,
+                        help = 'seed of the train/test split and of the sampler')
+    parser.add_argument('--mode', choices = ('optuna', 'sweep', 'select'), default = TUNING_MODE)
+    parser.add_argument('--workers', type = int, default = N_WORKERS, help = 'tuning processes')
+    parser.add_argument('--index', choices = ('auto', 'brute', 'kd_tree', 'ball_tree', 'ivf'),
+                        default = KNN_INDEX, help = 'neighbour index of a KNN model')
+    parser.add_argument('--n-lists', type = int, default = IVF_LISTS,
+                        help = 'ivf: number of k-means lists (default: sqrt of the training rows)')
+    parser.add_argument('--n-probe', type = int, default = IVF_PROBE,
+                        help = 'ivf: lists searched per query, the recall/latency knob')
+    return parser.parse_args(argv)
+
+def main(argv = None):
+
+    args = parse_args(argv)
+    started = time.monotonic()
+
+    x, y = prepare(*load_dataset(args.data, cache_dir = args.cache_dir,
+                                 use_cache = not args.no_cache))
+    ts = TrainingSet(x, y, seed = args.seed, data_sha256 = file_sha256(args.data))
+
+    if args.mode == 'select':
+        family, params, cv_f1 = select_model(ts, args)
+    elif args.mode == 'sweep':
+        family, params, cv_f1 = sweep_knn_grid(ts)
+    else:
+        family, params, cv_f1 = run_study(ts, args)
+
+    # Held-out scores of the chosen configuration, fitted on the training split only
+    pipe = clone(ts.pipe).set_params(model = FAMILIES[family][0](), **params)
+    test_pred = pipe.fit(ts.train_x, ts.train_y).predict(ts.test_x)
+
+    # Fitting the best model family and hyperparameters on all the data
+    pipe = clone(ts.pipe).set_params(model = FAMILIES[family][0](), **params)
+    if family == 'knn' and args.index != 'ivf':
+        pipe.set_params(model__algorithm = args.index)
+    pipe.fit(x, y)
+
+    # renamed into place, so a server watching the file never loads half of it
+    tmp = f'{args.output}.tmp-{os.getpid()}'
+    with open(tmp, 'wb') as f:
+        pickle.dump(pipe, f)
+    os.replace(tmp, args.output)
+
+    if family == 'knn':
+        index_info = export_knn(pipe, args.output, args, ts)
+    else:
+        index_info = None
+        # a KNN export from an earlier run would shadow this model in app.py
+        remove_fast_model(args.output)
+
+    meta = {'model_file' : os.path.basename(args.output),
+            'family' : family,
+            'params' : params,
+            'index' : index_info,
+            'features' : list(x.columns),
+            'classes' : [int(c) for c in np.unique(y)],
+            'metrics' : {'cv_f1_macro' : float(cv_f1),
+                         'test_f1_macro' : float(f1_score(ts.test_y, test_pred, average = 'macro')),
+                         'test_accuracy' : float(accuracy_score(ts.test_y, test_pred))},
+            'training_time_s' : round(time.monotonic() - started, 3),
+            'tuning_mode' : args.mode,
+            'trials' : args.trials,
+            'seed' : args.seed,
+            'data' : {'path' : os.path.abspath(args.data),
+                      'sha256' : ts.data_sha256,
+                      'rows' : int(len(x))},
+            'sklearn_version' : sklearn.__version__,
+            'created' : time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+    with open(metadata_path(args.output), 'w') as f:
+        json.dump(meta, f, indent = 2, default = str)
+
+    print(f'Saved {args.output} ({family}, cv f1_macro = {cv_f1:.4f}, '
+          f'test f1_macro = {meta["metrics"]["test_f1_macro"]:.4f}) in {meta["training_time_s"]} s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
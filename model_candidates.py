@@ -0,0 +1,96 @@
+# Candidate model families and their search spaces for the model-selection stage in model.py
+import numpy as np
+
+from sklearn.base import BaseEstimator, ClassifierMixin
+
+from sklearn.neighbors import KNeighborsClassifier
+
+from sklearn.ensemble import RandomForestClassifier
+
+from sklearn.tree import DecisionTreeClassifier
+
+try:
+    from xgboost import XGBClassifier
+except ImportError:                 # optional: the xgb family is skipped without it
+    XGBClassifier = None                # (and app.py needs it too to serve an xgb model)
+
+
+class LabelEncodedXGB(BaseEstimator, ClassifierMixin):
+    """
+    XGBClassifier that accepts arbitrary class labels. xgboost wants 0..n-1,
+    the seeds dataset uses 1..3, so labels are encoded on fit and decoded on
+    predict and the pickled pipeline predicts the original varieties.
+    """
+
+    def __init__(self, n_estimators = 100, max_depth = 3, learning_rate = 0.1,
+                 subsample = 1.0, n_jobs = 1, random_state = 0):
+        self.n_estimators = n_estimators
+        self.max_depth = max_depth
+        self.learning_rate = learning_rate
+        self.subsample = subsample
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+
+    def fit(self, X, y):
+        self.classes_, y_idx = np.unique(np.asarray(y), return_inverse = True)
+        self.booster_ = XGBClassifier(n_estimators = self.n_estimators, max_depth = self.max_depth,
+                                      learning_rate = self.learning_rate, subsample = self.subsample,
+                                      n_jobs = self.n_jobs, random_state = self.random_state)
+        self.booster_.fit(X, y_idx)
+        return self
+
+    def predict_proba(self, X):
+        return self.booster_.predict_proba(X)
+
+    def predict(self, X):
+        return self.classes_[np.asarray(self.booster_.predict(X), dtype = np.int64)]
+
+
+def knn_space(trial):
+    return {'model__n_neighbors' : trial.suggest_int('model__n_neighbors', 1, 20),
+            'model__metric' : trial.suggest_categorical('model__metric', ['euclidean', 'manhattan',
+                                                                          'minkowski']),
+            'model__weights' : trial.suggest_categorical('model__weights', ['uniform', 'distance'])}
+
+
+def rf_space(trial):
+    return {'model__n_estimators' : trial.suggest_int('model__n_estimators', 20, 300, log = True),
+            'model__max_depth' : trial.suggest_int('model__max_depth', 2, 12),
+            'model__min_samples_leaf' : trial.suggest_int('model__min_samples_leaf', 1, 5),
+            'model__max_features' : trial.suggest_categorical('model__max_features', ['sqrt', 'log2'])}
+
+
+def tree_space(trial):
+    return {'model__max_depth' : trial.suggest_int('model__max_depth', 2, 12),
+            'model__min_samples_leaf' : trial.suggest_int('model__min_samples_leaf', 1, 10),
+            'model__criterion' : trial.suggest_categorical('model__criterion', ['gini', 'entropy'])}
+
+
+def xgb_space(trial):
+    return {'model__n_estimators' : trial.suggest_int('model__n_estimators', 20, 300, log = True),
+            'model__max_depth' : trial.suggest_int('model__max_depth', 2, 8),
+            'model__learning_rate' : trial.suggest_float('model__learning_rate', 0.01, 0.3, log = True),
+            'model__subsample' : trial.suggest_float('model__subsample', 0.6, 1.0)}
+
+
+# family -> (estimator factory, search space). Tree ensembles run single-threaded
+# because the families are tuned side by side in separate processes.
+FAMILIES = {
+    'knn' : (KNeighborsClassifier, knn_space),
+    'rf' : (lambda: RandomForestClassifier(n_jobs = 1, random_state = 0), rf_space),
+    'tree' : (lambda: DecisionTreeClassifier(random_state = 0), tree_space),
+    'xgb' : (LabelEncodedXGB, xgb_space),
+}
+
+
+def available_families(names):
+    """The requested family names that can run here (xgb needs xgboost installed)."""
+    out = []
+    for name in names:
+        if name not in FAMILIES:
+            raise ValueError(f'unknown model family {name!r}, expected one of {sorted(FAMILIES)}')
+        if name == 'xgb' and XGBClassifier is None:
+            print('xgboost is not installed, skipping the xgb family')
+            continue
+        out.append(name)
+    return out
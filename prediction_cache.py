@@ -0,0 +1,102 @@
+# LRU / TTL cache of predictions keyed on quantized input features
+import hashlib
+
+import math
+
+import threading
+
+import time
+
+from collections import OrderedDict
+
+
+def file_hash(path, block_size = 1 << 20):
+    """sha256 of a file's content, used to tie cached predictions to one model."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache with an optional time-to-live.
+
+    Keys are feature rows rounded to `precision` decimals (one int per feature,
+    or a single int for all), so re-submitted measurements hit the cache.
+    The cache is bound to a model hash; binding a different hash clears it.
+    """
+
+    def __init__(self, maxsize = 10000, ttl = None, precision = 4):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.precision = precision
+        self.model_hash = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bind_model(self, model_hash):
+        with self._lock:
+            if model_hash != self.model_hash:
+                if self._data:
+                    self.invalidations += 1
+                self._data.clear()
+                self.model_hash = model_hash
+
+    def key(self, row):
+        precision = self.precision
+        if isinstance(precision, int):
+            precision = [precision] * len(row)
+        # NaN != NaN, so give missing values a fixed placeholder
+        return tuple(None if math.isnan(v) else round(float(v), p) for v, p in zip(row, precision))
+
+    def get(self, key):
+        """Cached value or None."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, stamp = entry
+                if self.ttl is None or time.monotonic() - stamp < self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value, model_hash = None):
+        """Store a prediction; skipped if it was made by a model that is no longer bound."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if model_hash is not None and model_hash != self.model_hash:
+                return
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last = False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits' : self.hits,
+                'misses' : self.misses,
+                'hit_rate' : self.hits / total if total else 0.0,
+                'size' : len(self._data),
+                'maxsize' : self.maxsize,
+                'ttl' : self.ttl,
+                'evictions' : self.evictions,
+                'invalidations' : self.invalidations,
+                'model_hash' : self.model_hash,
+            }
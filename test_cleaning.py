@@ -0,0 +1,52 @@
+"""
+lof_scores must equal sklearn's LocalOutlierFactor, also when rows repeat.
+
+    python -m pytest -q test_cleaning.py
+"""
+
+import os
+
+import numpy as np
+
+import pytest
+
+pytest.importorskip('sklearn')
+
+from sklearn.neighbors import LocalOutlierFactor
+
+from cleaning import Cleaner, lof_scores
+from data_loader import load_dataset
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'seeds_dataset.csv')
+
+
+def seeds():
+    return load_dataset(DATA_PATH, use_cache = False)[0].to_numpy(dtype = np.float64)
+
+
+def sklearn_lof(x, n_neighbors = 20):
+    return -LocalOutlierFactor(n_neighbors = n_neighbors).fit(x).negative_outlier_factor_
+
+
+@pytest.mark.parametrize('algorithm', ['kd_tree', 'ball_tree'])
+@pytest.mark.parametrize('chunk_rows', [7, 65536])
+def test_lof_matches_sklearn(algorithm, chunk_rows):
+    x = seeds()
+    np.testing.assert_allclose(lof_scores(x, algorithm = algorithm, chunk_rows = chunk_rows),
+                               sklearn_lof(x), rtol = 1e-9)
+
+
+@pytest.mark.filterwarnings('ignore:Duplicate values')
+@pytest.mark.parametrize('algorithm', ['kd_tree', 'ball_tree'])
+def test_lof_matches_sklearn_with_duplicates(algorithm):
+    # every row of a slice repeated, plus one row 25 times (more copies than neighbours)
+    x = seeds()
+    x = np.vstack([x, x[:40], np.repeat(x[[5]], 25, axis = 0)])
+    np.testing.assert_allclose(lof_scores(x, algorithm = algorithm, chunk_rows = 16),
+                               sklearn_lof(x), rtol = 1e-9)
+
+
+def test_cleaner_keeps_rows_under_the_sklearn_cutoff():
+    x = seeds()
+    expected = np.flatnonzero(sklearn_lof(x) <= 1.5)
+    np.testing.assert_array_equal(Cleaner(dedupe = False).keep_index(x), expected)
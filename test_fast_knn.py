@@ -0,0 +1,50 @@
+"""
+FastKNN must predict exactly what the pickled model.py pipeline predicts.
+
+    python -m pytest -q test_fast_knn.py
+"""
+
+import os
+
+import numpy as np
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('sklearn')
+pytest.importorskip('optuna')        # imported by model.py
+
+from data_loader import load_dataset
+from fast_knn import FastKNN, export_pipeline
+from model import DATA_PATH, build_pipeline, prepare
+
+
+@pytest.fixture(scope = 'module')
+def data():
+    return prepare(*load_dataset(DATA_PATH, use_cache = False))
+
+
+@pytest.fixture(scope = 'module')
+def queries(data):
+    """Training rows, jittered copies of them and a few rows with missing values."""
+    x = data[0].to_numpy(dtype = np.float64)
+    rng = np.random.RandomState(0)
+    rows = np.vstack([x, x + rng.normal(scale = 0.05, size = x.shape)])
+    rows[rng.rand(*rows.shape) < 0.05] = np.nan
+    return rows
+
+
+@pytest.mark.parametrize('weights', ['uniform', 'distance'])
+@pytest.mark.parametrize('metric, p', [('euclidean', 2), ('manhattan', 2), ('chebyshev', 2),
+                                       ('minkowski', 1), ('minkowski', 2), ('minkowski', 3)])
+def test_predict_matches_pipeline(data, queries, tmp_path, metric, p, weights):
+    x, y = data
+    pipe = build_pipeline(x).set_params(model__n_neighbors = 7, model__metric = metric,
+                                        model__p = p, model__weights = weights).fit(x, y)
+    path = os.path.join(tmp_path, 'model_fast.npz')
+    export_pipeline(pipe, path)
+
+    fast = FastKNN.load(path, mmap_mode = 'r')
+    assert np.isnan(queries).any()
+    expected = pipe.predict(pd.DataFrame(queries, columns = fast.features))
+    np.testing.assert_array_equal(fast.predict(queries), expected)
@@ -0,0 +1,196 @@
+"""
+ForexController against the local board simulator: what the board ends up
+showing after rollbacks, diff-mode suppression and a supervisor replay.
+
+    python -m pytest -q test_forex_controller.py
+"""
+
+import threading
+import time
+
+import pytest
+
+import Forex_345_digit_backend_final as forex
+from Forex_345_digit_backend_final import ForexController, PacedTransmitter, QUEUED
+from Forex_345_digit_simulator import ForexSimulator
+
+
+def wait_for(condition, timeout=5.0):
+    """Poll until condition() is true; the simulator applies frames on its own thread."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+class _FailingOverflowTransmitter(PacedTransmitter):
+    """Once `failing` is set, fails every overflow (E/G) frame, so a batch is sent partially and rolled back."""
+
+    failing = False
+
+    def _write(self, frame):
+        if self.failing and frame.command[0] in forex.OVERFLOW_MODULE_NAMES:
+            self.frames_failed += 1
+            return False
+        return super()._write(frame)
+
+
+@pytest.fixture
+def sim(monkeypatch):
+    monkeypatch.setattr(forex, 'DEBUG', False)
+    simulator = ForexSimulator()
+    host, port = simulator.start()
+    monkeypatch.setattr(forex, 'DEVICE_IP', host)
+    monkeypatch.setattr(forex, 'DEVICE_PORT', port)
+    yield simulator
+    simulator.stop()
+
+
+@pytest.fixture
+def make_controller(tmp_path):
+    controllers = []
+
+    def make(**kwargs):
+        controller = ForexController(str(tmp_path / 'forex_state.json'),
+                                     str(tmp_path / 'forex_submissions.jsonl'),
+                                     min_frame_gap=0.0, **kwargs)
+        controllers.append(controller)
+        return controller
+
+    yield make
+    for controller in controllers:
+        controller.shutdown()
+
+
+def test_batch_rollback_restores_the_display(sim, make_controller):
+    controller = make_controller(transmitter_cls=_FailingOverflowTransmitter)
+    assert controller.connect_to_device()
+    assert controller.set_currency_rates({'A': '12345'}) == {'A': True}
+    assert wait_for(lambda: sim.currency_value('A') == '12345')
+
+    controller.transmitter.failing = True
+    assert controller.set_currency_rates({'A': '23456', 'B': '34567'}) == {'A': False, 'B': False}
+
+    # the mains got through and were rolled back; nothing was committed
+    assert wait_for(lambda: sim.display()['A'] == '1234' and sim.display()['B'] == '0000')
+    assert sim.currency_value('A') == '12345'
+    assert controller.get_full_currency_value('A') == '12345'
+    assert controller.state['main_modules']['B'] == '0000'
+
+
+def test_diff_mode_suppresses_unchanged_frames(sim, make_controller):
+    controller = make_controller(diff_mode=True, force_refresh_interval=None)
+    assert controller.connect_to_device()
+    assert controller.set_currency_rates({'A': '12345'}) == {'A': True}
+    assert wait_for(lambda: sim.currency_value('A') == '12345')
+    applied = sim.stats['applied']
+
+    # the board blanks, but the controller believes it already shows A12345
+    sim.power_cycle()
+    assert controller.set_currency_rates({'A': '12345'}) == {'A': True}
+    controller.flush()
+    time.sleep(0.1)
+    assert controller.frames_suppressed == 2  # main A and overflow E
+    assert sim.stats['applied'] == applied
+    assert sim.display()['A'] == '0000'
+
+    # a changed digit only sends its own module
+    assert controller.set_currency_rates({'A': '12355'}) == {'A': True}
+    assert wait_for(lambda: sim.display()['A'] == '1235')
+    assert sim.stats['applied'] == applied + 1
+
+
+def test_supervisor_replays_state_and_queued_rates(sim, make_controller):
+    controller = make_controller()
+    controller.start_supervisor(probe_interval=0.05, backoff_base=0.05, backoff_max=0.2,
+                                connect_timeout=1.0)
+    assert wait_for(lambda: controller.client_socket is not None)
+    assert controller.set_currency_rates({'A': '12345'}) == {'A': True}
+    assert wait_for(lambda: sim.currency_value('A') == '12345')
+
+    # board goes away: the open connection is dropped and the supervisor notices
+    port = sim.port
+    sim.stop()
+    assert wait_for(lambda: controller.client_socket is None)
+    assert controller.set_currency_rates({'B': '23456', 'C': '12x'}) == {'B': QUEUED, 'C': False}
+    assert controller.pending_rates == {'B': '23456'}
+
+    # a fresh (blank) board on the same address gets the committed state, then the queue
+    replacement = ForexSimulator(port=port)
+    replacement.start()
+    try:
+        assert wait_for(lambda: replacement.currency_value('B') == '23456')
+        assert replacement.currency_value('A') == '12345'
+        assert controller.pending_rates == {}
+        assert controller.get_full_currency_value('B') == '23456'
+    finally:
+        controller.close_connection()
+        replacement.stop()
+
+
+def test_caller_batch_after_reconnect_is_not_overwritten_by_the_replay(sim, make_controller):
+    controller = make_controller()
+    controller.start_supervisor(probe_interval=0.05, backoff_base=0.05, backoff_max=0.2,
+                                connect_timeout=1.0)
+    assert wait_for(lambda: controller.client_socket is not None)
+    port = sim.port
+    sim.stop()
+    assert wait_for(lambda: controller.client_socket is None)
+    assert controller.set_currency_rates({'A': '22222'}) == {'A': QUEUED}
+
+    # a caller fires a newer A right as the connection comes back, before the replay
+    replay = controller.replay_after_reconnect
+    callers = []
+
+    def racing_replay():
+        caller = threading.Thread(target=controller.set_currency_rates, args=({'A': '33333'},))
+        caller.start()
+        caller.join(0.2)
+        callers.append(caller)
+        return replay()
+
+    controller.replay_after_reconnect = racing_replay
+    replacement = ForexSimulator(port=port)
+    replacement.start()
+    try:
+        assert wait_for(lambda: callers)
+        callers[0].join(5.0)
+        controller.flush()
+        assert wait_for(lambda: replacement.currency_value('A') == '33333')
+        time.sleep(0.1)
+        assert replacement.currency_value('A') == '33333'
+        assert controller.get_full_currency_value('A') == '33333'
+        assert controller.pending_rates == {}
+    finally:
+        controller.close_connection()
+        replacement.stop()
+
+
+def test_set_currency_rate_is_false_while_queued(sim, make_controller):
+    controller = make_controller()
+    controller.supervisor = forex.ConnectionSupervisor(controller)  # never started: stays disconnected
+    assert controller.set_currency_rate('A', '12345') is False
+    assert controller.pending_rates == {'A': '12345'}
+
+
+def test_failed_batch_does_not_count_suppressed_frames(sim, make_controller):
+    controller = make_controller(diff_mode=True, force_refresh_interval=None,
+                                 transmitter_cls=_FailingOverflowTransmitter)
+    assert controller.connect_to_device()
+    assert controller.set_currency_rates({'A': '12345', 'B': '23456'}) == {'A': True, 'B': True}
+
+    # A unchanged (main suppressed), B's main goes out, the shared overflow frame fails
+    controller.transmitter.failing = True
+    assert controller.set_currency_rates({'A': '12345', 'B': '34567'}) == {'A': False, 'B': False}
+    assert controller.frames_suppressed == 0
+    assert controller.frame_stats()['frames_failed'] == 2  # the E frame and its rollback
+
+
+def test_frame_stats_are_counted_by_the_base_class(sim, make_controller):
+    controller = make_controller()
+    assert controller.connect_to_device()
+    assert controller.set_currency_rates({'A': '12345'}) == {'A': True}
+    assert controller.frame_stats() == {'frames_sent': 2, 'frames_failed': 0,
+                                        'frames_suppressed': 0, 'bytes_sent': 10}